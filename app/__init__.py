@@ -1,60 +1,114 @@
+import sqlite3
 from flask import Flask
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from flasgger import Swagger
 from flask_jwt_extended import JWTManager
-from config import Config, TestingConfig
 
+# Before config is imported: its settings are read from the environment.
 load_dotenv()
+
+from config import BenchmarkConfig, Config, ProductionConfig, TestingConfig
+
 db = SQLAlchemy()
 migrate = Migrate()
 jwt = JWTManager()
 
 
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless asked per connection.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+class LazyAppGroup(AppGroup):
+    """
+    flask_app.cli that imports app.cli, and with it the argon2, storage and
+    session modules, only once the flask command looks up its commands, so
+    serving processes never pay for it.
+    """
+
+    _loaded = False
+
+    def _load(self):
+        if not self._loaded:
+            self._loaded = True
+            from app.cli import register_commands
+
+            register_commands(self)
+
+    def list_commands(self, ctx):
+        self._load()
+        return super().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        self._load()
+        return super().get_command(ctx, name)
+
+
 def create_app(config_class="develop"):
     flask_app = Flask("Photo_project")
+    flask_app.cli = LazyAppGroup(flask_app.name)
     if config_class == "develop":
         flask_app.config.from_object(Config)
+    elif config_class == "production":
+        flask_app.config.from_object(ProductionConfig)
+        missing = [
+            name
+            for name in ("SECRET_KEY", "JWT_SECRET_KEY")
+            if not flask_app.config.get(name)
+        ]
+        if missing:
+            raise RuntimeError(f"{', '.join(missing)} must be set in production")
     elif config_class == "test":
         flask_app.config.from_object(TestingConfig)
+    elif config_class == "benchmark":
+        flask_app.config.from_object(BenchmarkConfig)
+
+    from app.monitoring.pool import instrument_pool
+
+    config = flask_app.config
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = instrument_pool(
+        config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+    )
+    config["SQLALCHEMY_BINDS"] = {
+        bind: instrument_pool(options) if isinstance(options, dict) else options
+        for bind, options in (config.get("SQLALCHEMY_BINDS") or {}).items()
+    }
 
     db.init_app(flask_app)
+
+    from app.service.replicas import init_replicas
+
+    init_replicas(flask_app)
     migrate.init_app(flask_app, db)
     jwt.init_app(flask_app)
 
-    swagger_template = {
-        "swagger": "2.0",
-        "info": {
-            "title": "Curse photo project API",
-            "description": "This is a sample API to curse project.",
-            "version": "1.0.0",
-            "contact": {
-                "name": "API Support",
-                "url": "https://github.com/L1nixhvh/Photo_project_backend",
-                "email": "dennis.tihomirov@gmail.com",
-            },
-        },
-    }
-    swagger_config = {
-        "headers": [],
-        "specs": [
-            {
-                "endpoint": "apispec_1",
-                "route": "/{}.json".format("apispec_1"),
-                "rule_filter": lambda rule: True,  # all in
-                "model_filter": lambda tag: True,  # all in
-            }
-        ],
-        "static_url_path": "/flasgger_static",
-        "swagger_ui": True,
-        "specs_route": "/apidocs/",
-    }
-    Swagger(app=flask_app, template=swagger_template, config=swagger_config)
+    if flask_app.config.get("DIAGNOSTICS_ENABLED"):
+        from app.monitoring.diagnostics import init_diagnostics
+
+        init_diagnostics(flask_app, db)
+
+    from app.apidocs import init_apidocs
+
+    init_apidocs(flask_app)
 
     CORS(flask_app, resources={r"/*": {"origins": "*"}})
 
+    if flask_app.config.get("METRICS_ENABLED"):
+        from app.monitoring.metrics import init_metrics
+        from app.routes.metrics import metrics_Blueprint
+
+        init_metrics(flask_app)
+        flask_app.register_blueprint(metrics_Blueprint)
+
     from app.routes.user import auth_Blueprint
 
     flask_app.register_blueprint(auth_Blueprint, url_prefix="/api/user")
@@ -63,8 +117,16 @@ def create_app(config_class="develop"):
 
     flask_app.register_blueprint(photos_Blueprint, url_prefix="/api/photos")
 
+    if flask_app.config.get("INTERNAL_ENDPOINTS_ENABLED"):
+        from app.routes.internal import internal_Blueprint
+
+        flask_app.register_blueprint(internal_Blueprint, url_prefix="/internal")
+
     # Initialization database tables
     from app.models.users import Users
     from app.models.photos import Photos
+    from app.models.blobs import Blobs
+    from app.models.revoked_tokens import RevokedTokens
+    from app.models.refresh_tokens import RefreshTokens
 
     return flask_app
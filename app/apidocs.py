@@ -0,0 +1,84 @@
+from flask import current_app, jsonify
+import json
+import os
+
+SWAGGER_TEMPLATE = {
+    "swagger": "2.0",
+    "info": {
+        "title": "Curse photo project API",
+        "description": "This is a sample API to curse project.",
+        "version": "1.0.0",
+        "contact": {
+            "name": "API Support",
+            "url": "https://github.com/L1nixhvh/Photo_project_backend",
+            "email": "dennis.tihomirov@gmail.com",
+        },
+    },
+}
+SWAGGER_CONFIG = {
+    "headers": [],
+    "specs": [
+        {
+            "endpoint": "apispec_1",
+            "route": "/{}.json".format("apispec_1"),
+            "rule_filter": lambda rule: True,  # all in
+            "model_filter": lambda tag: True,  # all in
+        }
+    ],
+    "static_url_path": "/flasgger_static",
+    "swagger_ui": True,
+    "specs_route": "/apidocs/",
+}
+
+
+def init_apidocs(flask_app):
+    """
+    Serves the OpenAPI spec at /apispec_1.json.
+
+    With SWAGGER_UI the full flasgger UI is mounted as before. Without it,
+    flasgger is not even imported at startup: the spec is loaded from the
+    precompiled SWAGGER_SPEC_FILE or built on the first request, then kept
+    in memory either way.
+    """
+    if not flask_app.config.get("SWAGGER_ENABLED"):
+        return
+
+    if flask_app.config.get("SWAGGER_UI"):
+        from flasgger import Swagger
+
+        class CachedSwagger(Swagger):
+            # flasgger re-parses every docstring on each spec request.
+            def get_apispecs(self, endpoint="apispec_1"):
+                specs = self.__dict__.setdefault("_cached_specs", {})
+                if endpoint not in specs:
+                    specs[endpoint] = super().get_apispecs(endpoint)
+                return specs[endpoint]
+
+        CachedSwagger(app=flask_app, template=SWAGGER_TEMPLATE, config=SWAGGER_CONFIG)
+    else:
+        flask_app.add_url_rule("/apispec_1.json", "apispec_1", apispec)
+
+
+def apispec():
+    spec = current_app.extensions.get("apispec")
+    if spec is None:
+        path = current_app.config.get("SWAGGER_SPEC_FILE")
+        if path and os.path.exists(path):
+            with open(path) as spec_file:
+                spec = json.load(spec_file)
+        else:
+            spec = build_apispec(current_app)
+        current_app.extensions["apispec"] = spec
+    return jsonify(spec)
+
+
+def build_apispec(flask_app):
+    """Builds the spec from route docstrings; needs a request context."""
+    from flasgger import Swagger
+
+    swagger = Swagger(
+        template=SWAGGER_TEMPLATE, config={**SWAGGER_CONFIG, "swagger_ui": False}
+    )
+    swagger.app = flask_app
+    swagger.load_config(flask_app)
+    return swagger.get_apispecs("apispec_1")
@@ -0,0 +1,111 @@
+import click
+import json
+from flask import current_app
+from flask.cli import AppGroup
+from app.apidocs import build_apispec
+from app.monitoring.startup import StartupProbeFailed, measure_startup
+from app.service.blob_service import BlobsService
+from app.service.hashing import calibrate
+from app.service.revocation_service import RevocationService
+from app.service.session_service import SessionsService
+from app.service.storage import make_storage
+
+hashing_cli = AppGroup("hashing", help="Password hashing tools.")
+
+
+@hashing_cli.command("calibrate")
+@click.option(
+    "--target-ms", default=250.0, show_default=True, help="Target time per hash."
+)
+@click.option(
+    "--max-memory",
+    default=64 * 1024,
+    show_default=True,
+    help="Upper bound for memory_cost, KiB.",
+)
+@click.option("--parallelism", default=4, show_default=True)
+def calibrate_command(target_ms, max_memory, parallelism):
+    """Benchmark this host and print ARGON2_* settings for the .env file."""
+    params = calibrate(target_ms, max_memory_cost=max_memory, parallelism=parallelism)
+    click.echo(f"# measured {params['measured_ms']} ms per hash")
+    click.echo(f"ARGON2_TIME_COST={params['time_cost']}")
+    click.echo(f"ARGON2_MEMORY_COST={params['memory_cost']}")
+    click.echo(f"ARGON2_PARALLELISM={params['parallelism']}")
+
+
+storage_cli = AppGroup("storage", help="Photo blob storage tools.")
+
+
+@storage_cli.command("gc")
+@click.option(
+    "--grace",
+    default=3600,
+    show_default=True,
+    help="Only delete files unreferenced for at least this many seconds.",
+)
+def storage_gc_command(grace):
+    """Delete stored blobs that no photo references any more."""
+    removed = BlobsService().collect_garbage(make_storage(current_app.config), grace)
+    click.echo(f"Removed {removed} unreferenced blobs")
+
+
+tokens_cli = AppGroup("tokens", help="JWT revocation tools.")
+
+
+@tokens_cli.command("purge")
+def tokens_purge_command():
+    """Delete revocations and refresh tokens that have expired anyway."""
+    removed = RevocationService(current_app.config).purge_expired()
+    click.echo(f"Removed {removed} expired revocations")
+    removed = SessionsService(current_app.config).purge_expired()
+    click.echo(f"Removed {removed} expired refresh tokens")
+
+
+apidocs_cli = AppGroup("apidocs", help="OpenAPI spec tools.")
+
+
+@apidocs_cli.command("build")
+@click.option("--output", default="apispec.json", show_default=True)
+def apidocs_build_command(output):
+    """Precompile the OpenAPI spec; point SWAGGER_SPEC_FILE at the result."""
+    with current_app.test_request_context():
+        spec = build_apispec(current_app)
+    with open(output, "w") as spec_file:
+        json.dump(spec, spec_file)
+    click.echo(f"Wrote {len(spec.get('paths', {}))} paths to {output}")
+
+
+@click.command("startup-report")
+@click.option("--config", "config_class", default="production", show_default=True)
+@click.option("--top", default=15, show_default=True)
+@click.option(
+    "--budget-ms",
+    type=float,
+    default=None,
+    help="Fail when startup exceeds this; defaults to STARTUP_BUDGET_MS.",
+)
+def startup_report_command(config_class, top, budget_ms):
+    """Report import time per module and total create_app time."""
+    try:
+        total_ms, modules = measure_startup(config_class)
+    except StartupProbeFailed as error:
+        click.echo(str(error), err=True)
+        click.echo(f"create_app({config_class!r}) failed", err=True)
+        raise SystemExit(1)
+    for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:top]:
+        click.echo(f"{ms:10.1f} ms  {name}")
+    click.echo(f"{total_ms:10.1f} ms  total (import + create_app)")
+
+    if budget_ms is None:
+        budget_ms = current_app.config.get("STARTUP_BUDGET_MS")
+    if budget_ms and total_ms > budget_ms:
+        click.echo(f"Over the startup budget of {budget_ms:.0f} ms", err=True)
+        raise SystemExit(1)
+
+
+def register_commands(cli):
+    cli.add_command(hashing_cli)
+    cli.add_command(storage_cli)
+    cli.add_command(tokens_cli)
+    cli.add_command(apidocs_cli)
+    cli.add_command(startup_report_command)
@@ -0,0 +1,15 @@
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from app import db
+
+
+class Blobs(db.Model):
+    __tablename__ = "blobs"
+
+    sha256: so.Mapped[str] = so.mapped_column(sa.String(64), primary_key=True)
+    size: so.Mapped[int] = so.mapped_column(sa.BigInteger, nullable=False)
+    content_type: so.Mapped[str] = so.mapped_column(sa.String(127), nullable=False)
+    refcount: so.Mapped[int] = so.mapped_column(sa.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<Blob {self.sha256}, refs {self.refcount}>"
@@ -1,4 +1,5 @@
 import uuid
+import datetime
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 from app import db
@@ -6,6 +7,9 @@ from app import db
 
 class Photos(db.Model):
     __tablename__ = "photos"
+    # Serves keyset pagination of a user's photos: WHERE user_id = ?
+    # ORDER BY created_at DESC, id DESC is a plain index range scan.
+    __table_args__ = (sa.Index("idx_user_id", "user_id", "created_at", "id"),)
 
     id: so.Mapped[str] = so.mapped_column(
         sa.String(64), primary_key=True, default=str(uuid.uuid4())
@@ -15,8 +19,23 @@ class Photos(db.Model):
     )
     photo_url: so.Mapped[str] = so.mapped_column(sa.String(255), nullable=False)
     description: so.Mapped[str] = so.mapped_column(sa.Text, nullable=True)
+    # Set for photos uploaded to our blob storage, None for external URLs.
+    content_hash: so.Mapped[str] = so.mapped_column(
+        sa.String(64), sa.ForeignKey("blobs.sha256"), nullable=True, index=True
+    )
+    created_at: so.Mapped[datetime.datetime] = so.mapped_column(
+        sa.DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow,
+        server_default=sa.func.now(),
+    )
 
-    user = so.relationship("Users", backref="photos", lazy="joined")
+    # Loaded only on access; queries that need the owner opt in with
+    # .options(so.joinedload(Photos.user)). passive_deletes leaves removing
+    # a user's photos to ON DELETE CASCADE instead of loading them first.
+    user = so.relationship(
+        "Users", backref=so.backref("photos", passive_deletes=True), lazy="select"
+    )
 
     def __repr__(self):
         return f"<Photo {self.id}, User {self.user_id}>"
@@ -0,0 +1,30 @@
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from app import db
+
+
+class RefreshTokens(db.Model):
+    """
+    One row per issued refresh token. Tokens descending from one login
+    share a family; using a token marks it used and issues its successor.
+    """
+
+    __tablename__ = "refresh_tokens"
+
+    jti: so.Mapped[str] = so.mapped_column(sa.String(64), primary_key=True)
+    user_id: so.Mapped[str] = so.mapped_column(
+        sa.String(64),
+        sa.ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    family: so.Mapped[str] = so.mapped_column(sa.String(64), nullable=False, index=True)
+    # Epoch seconds, as the token's exp claim.
+    expires_at: so.Mapped[int] = so.mapped_column(
+        sa.BigInteger, nullable=False, index=True
+    )
+    # Epoch milliseconds; set once the token has been exchanged.
+    used_at: so.Mapped[int] = so.mapped_column(sa.BigInteger, nullable=True)
+
+    def __repr__(self):
+        return f"<RefreshToken {self.jti} of {self.user_id}>"
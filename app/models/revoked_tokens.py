@@ -0,0 +1,30 @@
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from app import db
+
+
+class RevokedTokens(db.Model):
+    """
+    Append-only log of JWT revocations. A row revokes either the single
+    token `jti` or, with `issued_before`, every token of `user_id` issued
+    before that moment. Times are epoch numbers, as in the JWT claims.
+    """
+
+    __tablename__ = "revoked_tokens"
+
+    id: so.Mapped[int] = so.mapped_column(sa.Integer, primary_key=True)
+    user_id: so.Mapped[str] = so.mapped_column(sa.String(64), nullable=False)
+    jti: so.Mapped[str] = so.mapped_column(sa.String(64), nullable=True)
+    # Milliseconds; compared with the token's iat_ms claim.
+    issued_before: so.Mapped[int] = so.mapped_column(sa.BigInteger, nullable=True)
+    # Seconds; once past, no token the row covers is still valid.
+    expires_at: so.Mapped[int] = so.mapped_column(
+        sa.BigInteger, nullable=False, index=True
+    )
+    # Milliseconds; processes poll for rows newer than what they have seen.
+    revoked_at: so.Mapped[int] = so.mapped_column(
+        sa.BigInteger, nullable=False, index=True
+    )
+
+    def __repr__(self):
+        return f"<RevokedToken {self.jti or 'all'} of {self.user_id}>"
@@ -0,0 +1,138 @@
+import collections
+import contextvars
+import logging
+import re
+import time
+from flask import current_app, g, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("request_queries", default=None)
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+# Transaction control is not the route's own work; savepoints in particular
+# come and go with the test fixtures.
+_TRANSACTION_CONTROL = re.compile(
+    r"^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE
+)
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more SQL statements than its route's query budget."""
+
+
+def query_budget(max_statements):
+    """
+    Caps the SQL statements one request to the decorated view may run while
+    diagnostics are on. Goes below @route, next to the other decorators.
+    """
+
+    def decorator(fn):
+        fn.query_budget = max_statements
+        return fn
+
+    return decorator
+
+
+def explain(conn, statement, parameters):
+    """EXPLAIN plan of a statement as text, or None if it cannot be explained."""
+    if not _EXPLAINABLE.match(statement):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    conn.info["diagnostics_explaining"] = True
+    try:
+        # In a savepoint: on Postgres a failed statement would otherwise
+        # abort the request's own transaction.
+        with conn.begin_nested():
+            rows = conn.exec_driver_sql(prefix + statement, parameters).all()
+    except Exception as error:
+        return f"<EXPLAIN failed: {error}>"
+    finally:
+        conn.info.pop("diagnostics_explaining", None)
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+def init_diagnostics(flask_app, db):
+    """
+    Development/staging aid, enabled by DIAGNOSTICS_ENABLED:
+
+    * statements slower than SLOW_QUERY_MS are logged with their EXPLAIN plan;
+    * a statement run QUERY_REPEAT_THRESHOLD times or more within one
+      request (same SQL, any parameters; the N+1 shape) is logged;
+    * a request running more statements than its view's @query_budget, or
+      QUERY_BUDGET_DEFAULT, is logged, or raises QueryBudgetExceeded when
+      QUERY_BUDGET_ACTION is "raise".
+    """
+    config = flask_app.config
+    slow_seconds = config.get("SLOW_QUERY_MS", 100) / 1000
+    repeat_threshold = config.get("QUERY_REPEAT_THRESHOLD", 5)
+    default_budget = config.get("QUERY_BUDGET_DEFAULT", 0)
+    raise_on_budget = config.get("QUERY_BUDGET_ACTION", "warn") == "raise"
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        if context is not None:
+            context._diagnostics_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("diagnostics_explaining"):
+            return
+        statements = _current.get()
+        if statements is not None and not _TRANSACTION_CONTROL.match(statement):
+            statements[statement] += 1
+        started = getattr(context, "_diagnostics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed >= slow_seconds:
+            plan = None if executemany else explain(conn, statement, parameters)
+            logger.warning(
+                "Slow query (%.1f ms): %s\nParameters: %r\nPlan:\n%s",
+                elapsed * 1000,
+                statement,
+                parameters,
+                plan,
+            )
+
+    with flask_app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    @flask_app.before_request
+    def start_query_diagnostics():
+        g.query_diagnostics_token = _current.set(collections.Counter())
+
+    @flask_app.after_request
+    def check_query_diagnostics(response):
+        statements = _current.get()
+        if statements is None:
+            return response
+        rule = request.url_rule.rule if request.url_rule else request.path
+        route = f"{request.method} {rule}"
+
+        for statement, count in statements.items():
+            if count >= repeat_threshold:
+                logger.warning(
+                    "Possible N+1 in %s: statement ran %d times: %s",
+                    route,
+                    count,
+                    statement,
+                )
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, "query_budget", default_budget)
+        total = sum(statements.values())
+        if budget and total > budget:
+            message = f"{route} ran {total} SQL statements, budget is {budget}"
+            if raise_on_budget:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    @flask_app.teardown_request
+    def reset_query_diagnostics(exc):
+        token = g.pop("query_diagnostics_token", None)
+        if token is not None:
+            _current.reset(token)
@@ -0,0 +1,230 @@
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds; the Prometheus client's default latency buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """What one request spent in SQL and in named spans such as argon2."""
+
+    __slots__ = ("started", "sql_count", "sql_seconds", "spans")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.spans = {}
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Adds the time spent in the block to span `name` of the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_span(name, time.perf_counter() - started)
+
+
+# Global, like the SQLite pragma listener: one contextvar lookup per
+# statement, and nothing at all outside an instrumented request.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current.get()
+    started = getattr(context, "_metrics_started", None)
+    if timings is not None and started is not None:
+        timings.sql_count += 1
+        timings.sql_seconds += time.perf_counter() - started
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense. Not locked."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(
+                f"{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}"
+            )
+        lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}')
+        lines.append(f"{name}_sum{_labels(labels)} {_number(self.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra):
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items.items()) + "}"
+
+
+class RequestMetrics:
+    """
+    Per-route request latency, SQL and span aggregates of one app. All
+    updates happen once per request, after the response is built, under a
+    single lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._statements = {}
+        self._requests = {}
+        self._sql_seconds = {}
+        self._spans = {}
+
+    def observe(self, method, route, status, seconds, timings):
+        key = (method, route)
+        with self._lock:
+            if key not in self._latency:
+                self._latency[key] = Histogram(LATENCY_BUCKETS)
+                self._statements[key] = Histogram(STATEMENT_BUCKETS)
+                self._sql_seconds[key] = 0.0
+            self._latency[key].observe(seconds)
+            self._statements[key].observe(timings.sql_count)
+            self._sql_seconds[key] += timings.sql_seconds
+            counter = (method, route, status)
+            self._requests[counter] = self._requests.get(counter, 0) + 1
+            for name, span_seconds in timings.spans.items():
+                if name not in self._spans:
+                    self._spans[name] = Histogram(LATENCY_BUCKETS)
+                self._spans[name].observe(span_seconds)
+
+    def render(self):
+        """Prometheus text exposition format, version 0.0.4."""
+        with self._lock:
+            lines = [
+                "# HELP http_request_duration_seconds Request latency by route.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), histogram in sorted(self._latency.items()):
+                lines += histogram.render(
+                    "http_request_duration_seconds",
+                    {"method": method, "route": route},
+                )
+            lines += [
+                "# HELP http_requests_total Requests by route and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self._requests.items()):
+                labels = {"method": method, "route": route, "status": status}
+                lines.append(f"http_requests_total{_labels(labels)} {count}")
+            lines += [
+                "# HELP http_request_db_statements SQL statements per request.",
+                "# TYPE http_request_db_statements histogram",
+            ]
+            for (method, route), histogram in sorted(self._statements.items()):
+                lines += histogram.render(
+                    "http_request_db_statements", {"method": method, "route": route}
+                )
+            lines += [
+                "# HELP http_request_db_seconds_total Time spent in SQL by route.",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for (method, route), seconds in sorted(self._sql_seconds.items()):
+                labels = {"method": method, "route": route}
+                lines.append(
+                    f"http_request_db_seconds_total{_labels(labels)} {_number(seconds)}"
+                )
+            lines += [
+                "# HELP http_request_span_duration_seconds Time per request in a named span.",
+                "# TYPE http_request_span_duration_seconds histogram",
+            ]
+            for name, histogram in sorted(self._spans.items()):
+                lines += histogram.render(
+                    "http_request_span_duration_seconds", {"span": name}
+                )
+            return "\n".join(lines) + "\n"
+
+
+def server_timing(total_seconds, timings):
+    entries = [
+        f"app;dur={total_seconds * 1000:.1f}",
+        f'db;dur={timings.sql_seconds * 1000:.1f};desc="{timings.sql_count} queries"',
+    ]
+    entries += [
+        f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.spans.items()
+    ]
+    return ", ".join(entries)
+
+
+def init_metrics(flask_app):
+    """
+    Times every request of flask_app into app.extensions["metrics"] and,
+    with SERVER_TIMING_ENABLED, reports app, db and span time in a
+    Server-Timing header.
+    """
+    metrics = RequestMetrics()
+    flask_app.extensions["metrics"] = metrics
+    emit_header = flask_app.config.get("SERVER_TIMING_ENABLED", True)
+
+    @flask_app.before_request
+    def start_request_timing():
+        timings = RequestTimings()
+        g.request_timings = timings
+        g.request_timings_token = _current.set(timings)
+
+    @flask_app.after_request
+    def finish_request_timing(response):
+        timings = g.pop("request_timings", None)
+        if timings is None:
+            return response
+        elapsed = time.perf_counter() - timings.started
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        metrics.observe(
+            request.method, route, str(response.status_code), elapsed, timings
+        )
+        if emit_header:
+            response.headers["Server-Timing"] = server_timing(elapsed, timings)
+        return response
+
+    @flask_app.teardown_request
+    def reset_request_timing(exc):
+        token = g.pop("request_timings_token", None)
+        if token is not None:
+            _current.reset(token)
@@ -0,0 +1,95 @@
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStats:
+    """Checkout counters shared by a pool and the pools it is recreated as."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / attempts * 1000, 3)
+                if attempts
+                else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that measures how long each checkout waits for a connection.
+    Pool events only fire once a connection is handed out, so the wait is
+    timed around _do_get(): the queue wait, plus opening a connection when
+    the pool has to, but not the pre-ping of the connection it returns.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same
+        # stats so the numbers survive dispose() in forked workers.
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return record
+
+
+def instrument_pool(options):
+    """
+    Engine options (or a bind's options with its "url") with
+    InstrumentedQueuePool as the pool class. Options without pool settings,
+    i.e. SQLite's defaults, are returned unchanged.
+    """
+    options = dict(options)
+    if set(options) - {"url"}:
+        options.setdefault("poolclass", InstrumentedQueuePool)
+    return options
+
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            }
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(pool.stats.snapshot())
+    return status
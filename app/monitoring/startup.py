@@ -0,0 +1,48 @@
+import subprocess
+import sys
+
+PROBE = (
+    "import time\n"
+    "started = time.perf_counter()\n"
+    "from app import create_app\n"
+    "create_app({config!r})\n"
+    "print((time.perf_counter() - started) * 1000)\n"
+)
+
+
+class StartupProbeFailed(Exception):
+    """The probe interpreter exited with an error; the message is its stderr."""
+
+
+def measure_startup(config_class):
+    """
+    Imports the app and runs create_app in a fresh interpreter under
+    -X importtime. Returns (total_ms, modules) where modules maps each
+    top-level import, and each import made directly by those, to its
+    cumulative import time in ms. Raises StartupProbeFailed when the app
+    cannot be created.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(config=config_class)],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise StartupProbeFailed(
+            "\n".join(
+                line
+                for line in completed.stderr.splitlines()
+                if not line.startswith("import time:")
+            )
+        )
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Each nesting level adds two spaces of indent. Keep the modules the
+        # app imports directly; deeper ones are included in their parents.
+        if len(name) - len(name.lstrip()) <= 3:
+            modules[name.strip()] = int(cumulative) / 1000
+    total_ms = float(completed.stdout.strip().splitlines()[-1])
+    return total_ms, modules
@@ -0,0 +1,73 @@
+from flask import jsonify, Blueprint, current_app
+from app import db
+from app.monitoring.pool import pool_status
+
+internal_Blueprint = Blueprint("internal_Blueprint", __name__)
+
+
+@internal_Blueprint.route("/pool", methods=["GET"])
+def pool():
+    """
+    Connection pool stats
+    ---
+    tags:
+      - Internal
+    summary: "SQLAlchemy connection pool statistics"
+    description: "Checked-out, overflow and checkout wait stats per database engine, for sizing the pool. Read replicas also report whether reads are currently routed to them."
+    responses:
+      200:
+        description: "Pool stats keyed by bind name"
+    """
+    stats = {
+        bind or "default": pool_status(engine) for bind, engine in db.engines.items()
+    }
+    router = current_app.extensions.get("replicas")
+    if router is not None:
+        for bind, health in router.status().items():
+            stats.setdefault(bind, {}).update(health)
+    return jsonify(stats), 200
+
+
+@internal_Blueprint.route("/hashing", methods=["GET"])
+def hashing():
+    """
+    Password hashing pool stats
+    ---
+    tags:
+      - Internal
+    summary: "Argon2 worker pool statistics"
+    description: "In-flight work, queue depth, rejections and timeouts of the password hashing pool."
+    responses:
+      200:
+        description: "Hashing pool stats"
+    """
+    from app.routes.user import auth_Blueprint
+
+    return jsonify(auth_Blueprint.users.hashing.stats()), 200
+
+
+@internal_Blueprint.route("/cache", methods=["GET"])
+def cache():
+    """
+    Cache stats
+    ---
+    tags:
+      - Internal
+    summary: "In-process cache statistics"
+    description: "Size, hit, miss and eviction counters of the in-process caches."
+    responses:
+      200:
+        description: "Cache stats keyed by cache name"
+    """
+    from app.routes.photos import photos_Blueprint
+    from app.routes.user import auth_Blueprint
+
+    return (
+        jsonify(
+            {
+                "photos": photos_Blueprint.photos.cache.stats(),
+                "users": auth_Blueprint.users.identity_cache.stats(),
+            }
+        ),
+        200,
+    )
@@ -0,0 +1,25 @@
+from flask import Blueprint, current_app
+
+metrics_Blueprint = Blueprint("metrics_Blueprint", __name__)
+
+
+@metrics_Blueprint.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus metrics
+    ---
+    tags:
+      - Internal
+    summary: "Request, SQL and password hashing metrics"
+    description: "Per-route latency and SQL statement histograms, request counters and argon2 time, in Prometheus text format."
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: "Metrics in Prometheus text exposition format 0.0.4"
+    """
+    return (
+        current_app.extensions["metrics"].render(),
+        200,
+        {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
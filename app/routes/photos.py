@@ -1,6 +1,30 @@
-from flask import request, jsonify, Blueprint
+from flask import (
+    request,
+    jsonify,
+    Blueprint,
+    current_app,
+    Response,
+    stream_with_context,
+    url_for,
+)
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.service.photo_service import PhotosService
+from app.service.photo_service import (
+    LIST_CURSOR,
+    SEARCH_CURSOR,
+    PhotosService,
+    decode_cursor,
+)
+from app.service.storage import BlobTooLarge
+from app.service.delivery import blob_response
+from app.service.http_cache import conditional
+from app.monitoring.diagnostics import query_budget
+import json
+import uuid
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# photos.photo_url is varchar(255)
+MAX_PHOTO_URL_LENGTH = 255
 
 photos_Blueprint = Blueprint("photos_Blueprint", __name__)
 
@@ -8,7 +32,232 @@ photos_Blueprint = Blueprint("photos_Blueprint", __name__)
 @photos_Blueprint.record
 def init_photos_blueprint(state):
 
-    photos_Blueprint.photos = PhotosService()
+    photos_Blueprint.photos = PhotosService(state.app.config)
+
+
+def page_args(cursor_types):
+    """
+    Reads limit and cursor from the query string. Returns (limit, cursor,
+    None), or (None, None, error response) when either is invalid.
+    """
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return None, None, (jsonify({"msg": "Invalid limit"}), 400)
+
+    cursor = request.args.get("cursor")
+    if not cursor:
+        return limit, None, None
+    try:
+        return limit, decode_cursor(cursor, cursor_types), None
+    except ValueError:
+        return None, None, (jsonify({"msg": "Invalid cursor"}), 400)
+
+
+def photo_json(row, **extra):
+    return {
+        "id": row.id,
+        "photo_url": row.photo_url,
+        "description": row.description,
+        "created_at": row.created_at.isoformat(),
+        **extra,
+    }
+
+
+# The ETag hashes the page the keyset query returns, so a 304 costs the
+# same O(page) query as a 200 and nothing per photo of the user.
+@photos_Blueprint.route("/", methods=["GET"])
+@query_budget(3)
+@jwt_required()
+@conditional(cache_control="private, no-cache")
+def list_photos():
+    """
+    List Photos
+    ---
+    tags:
+      - Photos
+    summary: "List photos of the authenticated user"
+    description: "Returns the user's photos, newest first, one page at a time. Pass next_cursor from the previous page to fetch the next one."
+    parameters:
+      - name: user_id
+        in: query
+        type: string
+        required: true
+        description: ID of the user (JWT token)
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (1-100, default 20)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor returned as next_cursor by the previous page
+    responses:
+      200:
+        description: "Page of photos"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                photos:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      id:
+                        type: string
+                      photo_url:
+                        type: string
+                      description:
+                        type: string
+                      created_at:
+                        type: string
+                        format: date-time
+                next_cursor:
+                  type: string
+                  description: "Cursor of the next page, null on the last page."
+      304:
+        description: "Not modified since the ETag in If-None-Match"
+      400:
+        description: "Invalid limit or cursor"
+      401:
+        description: "Unauthorized, JWT required"
+    """
+    user_id = get_jwt_identity()
+    limit, cursor, error = page_args(LIST_CURSOR)
+    if error is not None:
+        return error
+
+    page = photos_Blueprint.photos.get_user_photos(user_id, limit, cursor)
+    if page is None:
+        return jsonify({"msg": "Error, try later"}), 400
+
+    rows, next_cursor = page
+    photos = [photo_json(row) for row in rows]
+    return jsonify({"photos": photos, "next_cursor": next_cursor}), 200
+
+
+@photos_Blueprint.route("/search", methods=["GET"])
+@query_budget(3)
+@jwt_required()
+@conditional(cache_control="private, no-cache")
+def search_photos():
+    """
+    Search Photos
+    ---
+    tags:
+      - Photos
+    summary: "Full-text search over the authenticated user's photo descriptions"
+    description: "Returns photos whose description contains every word of q, best match first, one page at a time."
+    parameters:
+      - name: user_id
+        in: query
+        type: string
+        required: true
+        description: ID of the user (JWT token)
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Search words
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (1-100, default 20)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Opaque cursor returned as next_cursor by the previous page
+    responses:
+      200:
+        description: "Page of matching photos"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                photos:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      id:
+                        type: string
+                      photo_url:
+                        type: string
+                      description:
+                        type: string
+                      created_at:
+                        type: string
+                        format: date-time
+                      rank:
+                        type: number
+                next_cursor:
+                  type: string
+                  description: "Cursor of the next page, null on the last page."
+      304:
+        description: "Not modified since the ETag in If-None-Match"
+      400:
+        description: "Missing query, invalid limit or cursor"
+      401:
+        description: "Unauthorized, JWT required"
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"msg": "Missing data"}), 400
+
+    limit, cursor, error = page_args(SEARCH_CURSOR)
+    if error is not None:
+        return error
+
+    page = photos_Blueprint.photos.search_user_photos(
+        get_jwt_identity(), query, limit, cursor
+    )
+    if page is None:
+        return jsonify({"msg": "Error, try later"}), 400
+
+    rows, next_cursor = page
+    photos = [photo_json(row, rank=row.rank) for row in rows]
+    return jsonify({"photos": photos, "next_cursor": next_cursor}), 200
+
+
+@photos_Blueprint.route("/export", methods=["GET"])
+@jwt_required()
+def export_photos():
+    """
+    Export Photos
+    ---
+    tags:
+      - Photos
+    summary: "Export all photos of the authenticated user"
+    description: "Streams every photo of the user as newline-delimited JSON, oldest first, one object per line."
+    produces:
+      - application/x-ndjson
+    parameters:
+      - name: user_id
+        in: query
+        type: string
+        required: true
+        description: ID of the user (JWT token)
+    responses:
+      200:
+        description: "NDJSON stream of photos"
+      401:
+        description: "Unauthorized, JWT required"
+    """
+    user_id = get_jwt_identity()
+
+    def generate():
+        for row in photos_Blueprint.photos.iter_user_photos(user_id):
+            yield json.dumps(photo_json(row)) + "\n"
+
+    return Response(
+        stream_with_context(generate()), 200, mimetype="application/x-ndjson"
+    )
 
 
 @photos_Blueprint.route("/add", methods=["POST"])
@@ -87,6 +336,281 @@ def add_photo():
     )
 
 
+@photos_Blueprint.route("/add/batch", methods=["POST"])
+@jwt_required()
+def add_photos_batch():
+    """
+    Add Photos Batch
+    ---
+    tags:
+      - Photos
+    summary: "Add many photos for the authenticated user at once"
+    description: "Validates every item first, then writes all valid items in a single transaction. Results are returned per item, in request order."
+    parameters:
+      - name: user_id
+        in: query
+        type: string
+        required: true
+        description: ID of the user (JWT token)
+      - name: photos
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            photos:
+              type: array
+              items:
+                type: object
+                properties:
+                  photo_url:
+                    type: string
+                  description:
+                    type: string
+                required:
+                  - photo_url
+          required:
+            - photos
+    responses:
+      200:
+        description: "Valid items were added"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                msg:
+                  type: string
+                  example: "Photos added"
+                results:
+                  type: array
+                  items:
+                    type: object
+                    properties:
+                      photo_id:
+                        type: string
+                        description: "Set when the item was added."
+                      error:
+                        type: string
+                        description: "Set when the item was rejected."
+      400:
+        description: "Invalid request data or no valid items"
+      401:
+        description: "Unauthorized, JWT required"
+    """
+    if not request.is_json:
+        return jsonify({"msg": "Missing JSON in request"}), 400
+
+    user_id = get_jwt_identity()
+    items = request.json.get("photos") if isinstance(request.json, dict) else None
+
+    if not items:
+        return jsonify({"msg": "Missing data"}), 400
+
+    if type(items) != list:
+        return jsonify({"msg": "Incorrect data type detected"}), 400
+
+    if len(items) > current_app.config["PHOTOS_BATCH_MAX_ITEMS"]:
+        return jsonify({"msg": "Too many items"}), 400
+
+    results = []
+    valid = []
+    for item in items:
+        if type(item) != dict or not item.get("photo_url"):
+            results.append({"error": "Missing data"})
+            continue
+        photo_url = item.get("photo_url")
+        description = item.get("description")
+        if type(photo_url) != str or (type(description) != str and description != None):
+            results.append({"error": "Incorrect data type detected"})
+            continue
+        if len(photo_url) > MAX_PHOTO_URL_LENGTH:
+            results.append({"error": "Photo URL too long"})
+            continue
+        results.append(None)
+        valid.append((photo_url, description))
+
+    if not valid:
+        return jsonify({"msg": "No valid items", "results": results}), 400
+
+    photo_ids = photos_Blueprint.photos.insert_photos(user_id, valid)
+    if photo_ids is False:
+        return jsonify({"msg": "Error, try later"}), 400
+
+    photo_ids = iter(photo_ids)
+    results = [
+        result if result is not None else {"photo_id": next(photo_ids)}
+        for result in results
+    ]
+    return jsonify({"msg": "Photos added", "results": results}), 200
+
+
+@photos_Blueprint.route("/upload", methods=["POST"])
+@jwt_required()
+def upload_photo():
+    """
+    Upload Photo
+    ---
+    tags:
+      - Photos
+    summary: "Upload photo bytes for the authenticated user"
+    description: "The request body is the raw image, sent with its image/* Content-Type. It is streamed to storage in chunks and stored once per distinct content."
+    consumes:
+      - image/jpeg
+      - image/png
+      - image/webp
+    parameters:
+      - name: user_id
+        in: query
+        type: string
+        required: true
+        description: ID of the user (JWT token)
+      - name: description
+        in: query
+        type: string
+        required: false
+        description: Photo description
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: string
+          format: binary
+    responses:
+      200:
+        description: "Photo uploaded successfully"
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                msg:
+                  type: string
+                  example: "Photo uploaded successfully"
+                photo_id:
+                  type: string
+                photo_url:
+                  type: string
+                content_hash:
+                  type: string
+                  description: "SHA-256 of the photo bytes."
+      400:
+        description: "Empty body"
+      401:
+        description: "Unauthorized, JWT required"
+      413:
+        description: "File too large"
+      415:
+        description: "Content-Type is not an image"
+    """
+    if not request.mimetype.startswith("image/"):
+        return jsonify({"msg": "Unsupported media type"}), 415
+
+    user_id = get_jwt_identity()
+    description = request.args.get("description")
+    photos = photos_Blueprint.photos
+
+    try:
+        content_hash, size = photos.storage.save(
+            request.stream, max_size=photos.max_upload_size
+        )
+    except BlobTooLarge:
+        return jsonify({"msg": "File too large"}), 413
+
+    if not size:
+        return jsonify({"msg": "Missing data"}), 400
+
+    photo_id = str(uuid.uuid4())
+    photo_url = url_for("photos_Blueprint.get_photo_content", photo_id=photo_id)
+    if not photos.insert_photo(
+        user_id,
+        photo_url,
+        description,
+        photo_id=photo_id,
+        content_hash=content_hash,
+        size=size,
+        content_type=request.mimetype,
+    ):
+        return jsonify({"msg": "Error, try later"}), 400
+
+    return (
+        jsonify(
+            {
+                "msg": "Photo uploaded successfully",
+                "photo_id": photo_id,
+                "photo_url": photo_url,
+                "content_hash": content_hash,
+            }
+        ),
+        200,
+    )
+
+
+@photos_Blueprint.route("/<string:photo_id>/content", methods=["GET"])
+@query_budget(2)
+@jwt_required()
+def get_photo_content(photo_id):
+    """
+    Photo Content
+    ---
+    tags:
+      - Photos
+    summary: "Download the bytes of an uploaded photo"
+    description: "Returns the stored image of a photo owned by the authenticated user. Supports If-None-Match (the ETag is the content hash) and single or multiple byte Ranges."
+    parameters:
+      - name: user_id
+        in: query
+        type: string
+        required: true
+        description: ID of the user (JWT token)
+      - name: photo_id
+        in: path
+        type: string
+        required: true
+        description: Photo id
+      - name: Range
+        in: header
+        type: string
+        required: false
+        description: "Byte ranges, e.g. bytes=0-99,200-299"
+      - name: If-None-Match
+        in: header
+        type: string
+        required: false
+        description: ETag from a previous response
+    responses:
+      200:
+        description: "Photo bytes"
+      206:
+        description: "Requested byte range(s); multipart/byteranges for several"
+      304:
+        description: "Not modified"
+      401:
+        description: "Unauthorized, JWT required"
+      404:
+        description: "Photo not found or has no uploaded content"
+      416:
+        description: "Range not satisfiable"
+    """
+    photos = photos_Blueprint.photos
+    photo = photos.get_photo_by_id(photo_id, reader_id=get_jwt_identity())
+    if (
+        photo is None
+        or photo.user_id != get_jwt_identity()
+        or photo.content_hash is None
+    ):
+        return jsonify({"msg": "Photo not found"}), 404
+
+    return blob_response(
+        photos.storage,
+        photo.content_hash,
+        photo.content_type,
+        photo.size,
+        offload=current_app.config.get("STORAGE_OFFLOAD"),
+        accel_prefix=current_app.config.get("STORAGE_ACCEL_PREFIX", "/"),
+    )
+
+
 @photos_Blueprint.route("/delete/<string:photo_id>", methods=["DELETE"])
 @jwt_required()
 def delete_photo(photo_id):
@@ -130,7 +654,7 @@ def delete_photo(photo_id):
                   type: string
                   example: "Delete not successful"
       404:
-        description: "Photo not found"
+        description: "Photo not found or owned by another user"
         content:
           application/json:
             schema:
@@ -142,11 +666,11 @@ def delete_photo(photo_id):
       401:
         description: "Unauthorized, JWT required"
     """
-    photo = photos_Blueprint.photos.get_photo_by_id(photo_id)
-    if not photo:
+    deleted = photos_Blueprint.photos.delete_photo(photo_id, get_jwt_identity())
+    if deleted is None:
         return jsonify({"msg": "Photo not found"}), 404
 
-    if photos_Blueprint.photos.delete_photo(photo):
+    if deleted:
         return jsonify({"msg": "Delete successful"}), 200
     else:
         return jsonify({"msg": "Delete not successful"}), 400
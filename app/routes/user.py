@@ -1,8 +1,11 @@
-from app.service.user_service import UsersService
-from flask import request, jsonify, Blueprint
+from app.service.user_service import UsersService, UserExistsError
+from app.service.hashing import HashingUnavailable
+from app.service.revocation_service import RevocationService, now_ms
+from app.service.session_service import SessionsService, RefreshTokenReused
+from flask import request, jsonify, Blueprint, current_app
 from argon2.exceptions import VerifyMismatchError
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import datetime
+from flask_jwt_extended import jwt_required, current_user, get_jwt
+from app import jwt
 
 auth_Blueprint = Blueprint("auth_Blueprint", __name__)
 
@@ -10,7 +13,38 @@ auth_Blueprint = Blueprint("auth_Blueprint", __name__)
 @auth_Blueprint.record
 def init_auth_blueprint(state):
 
-    auth_Blueprint.users = UsersService()
+    auth_Blueprint.users = UsersService(state.app.config)
+    auth_Blueprint.revocations = RevocationService(state.app.config)
+    auth_Blueprint.sessions = SessionsService(state.app.config)
+
+
+def max_token_lifetime():
+    config = current_app.config
+    return max(
+        config["JWT_ACCESS_TOKEN_EXPIRES"], config["JWT_REFRESH_TOKEN_EXPIRES"]
+    ).total_seconds()
+
+
+@jwt.user_lookup_loader
+def user_lookup_callback(_jwt_header, jwt_data):
+    return auth_Blueprint.users.get_user_record(jwt_data["sub"])
+
+
+@jwt.user_lookup_error_loader
+def user_lookup_error_callback(_jwt_header, jwt_data):
+    return jsonify({"msg": "User not found"}), 400
+
+
+@jwt.token_in_blocklist_loader
+def token_in_blocklist_callback(_jwt_header, jwt_data):
+    return auth_Blueprint.revocations.is_revoked(jwt_data)
+
+
+@jwt.additional_claims_loader
+def additional_claims_callback(identity):
+    # iat has one-second resolution; revoke-all needs to tell apart tokens
+    # issued just before and just after it.
+    return {"iat_ms": now_ms()}
 
 
 @auth_Blueprint.route("/login", methods=["POST"])
@@ -50,10 +84,15 @@ def login():
             access_token:
               type: string
               description: "JWT access token"
+            refresh_token:
+              type: string
+              description: "JWT refresh token, for /api/user/refresh"
       400:
         description: "Missing or incorrect data"
       401:
         description: "Incorrect username or password"
+      503:
+        description: "Password hashing is saturated, try later"
     """
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
@@ -67,21 +106,38 @@ def login():
     if type(username) != str or type(password) != str:
         return jsonify({"msg": "Incorrect data type detected"}), 400
 
-    user = auth_Blueprint.users.find_user(username)
+    user = auth_Blueprint.users.find_user_by_username(username)
 
     if not user:
         return jsonify({"msg": "Auth incorrect login or password"}), 401
     try:
         auth_Blueprint.users.check_password(user.password_hash, password)
-        access_token = create_access_token(
-            identity=user.id, expires_delta=datetime.timedelta(minutes=60)
-        )
+        if auth_Blueprint.users.needs_rehash(user.password_hash):
+            # Cost parameters changed since this hash was made: upgrade it
+            # now that the plain password is at hand.
+            try:
+                auth_Blueprint.users.update_password_hash(
+                    user, auth_Blueprint.users.set_password(password)
+                )
+            except HashingUnavailable:
+                pass
+        tokens = auth_Blueprint.sessions.start(user.id)
+        if tokens is None:
+            return jsonify({"msg": "Error, try later"}), 400
         return (
-            jsonify({"msg": "Login success", "access_token": access_token}),
+            jsonify(
+                {
+                    "msg": "Login success",
+                    "access_token": tokens[0],
+                    "refresh_token": tokens[1],
+                }
+            ),
             200,
         )
     except VerifyMismatchError:
         return jsonify({"msg": "Auth incorrect login or password"}), 401
+    except HashingUnavailable:
+        return jsonify({"msg": "Service busy, try later"}), 503
 
 
 @auth_Blueprint.route("/register", methods=["POST"])
@@ -126,6 +182,8 @@ def register():
         description: "Invalid or missing data"
       401:
         description: "Username or email already exists"
+      503:
+        description: "Password hashing is saturated, try later"
     """
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
@@ -140,17 +198,17 @@ def register():
     if type(username) != str or type(email) != str or type(password) != str:
         return jsonify({"msg": "Incorrect data type detected"}), 400
 
-    user = auth_Blueprint.users.find_user(username, email)
+    try:
+        hash_password = auth_Blueprint.users.set_password(password)
+    except HashingUnavailable:
+        return jsonify({"msg": "Service busy, try later"}), 503
 
-    if user:
-        if user.username == username:
+    try:
+        user_id = auth_Blueprint.users.insert_user(username, email, hash_password)
+    except UserExistsError as error:
+        if error.field == "username":
             return jsonify({"msg": "Auth register existing login"}), 401
-        if user.email == email:
-            return jsonify({"msg": "Auth register existing email"}), 401
-
-    hash_password = auth_Blueprint.users.set_password(password)
-
-    user_id = auth_Blueprint.users.insert_user(username, email, hash_password)
+        return jsonify({"msg": "Auth register existing email"}), 401
     if not user_id:
         return jsonify({"msg": "Error, try later"}), 400
 
@@ -181,13 +239,7 @@ def delete():
       401:
         description: "Unauthorized, JWT required"
     """
-    user_id = get_jwt_identity()
-    user = auth_Blueprint.users.find_user(id=user_id)
-
-    if not user:
-        return jsonify({"msg": "User not found"}), 400
-
-    if auth_Blueprint.users.delete_user(user):
+    if auth_Blueprint.users.delete_user(current_user):
         return jsonify({"msg": "Delete successful"}), 200
     else:
         return jsonify({"msg": "Delete not successful"}), 400
@@ -230,7 +282,6 @@ def edit():
       422:
         description: "Invalid email format"
     """
-    user_id = get_jwt_identity()
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
 
@@ -242,11 +293,108 @@ def edit():
     if type(email) != str:
         return jsonify({"msg": "Incorrect data type detected"}), 400
 
-    user = auth_Blueprint.users.find_user(id=user_id)
-    if not user:
-        return jsonify({"msg": "User not found"}), 400
-
-    if auth_Blueprint.users.update_email(user, email):
+    if auth_Blueprint.users.update_email(current_user, email):
         return jsonify({"msg": "Update successful"}), 200
     else:
         return jsonify({"msg": "Update not successful"}), 400
+
+
+@auth_Blueprint.route("/logout", methods=["POST"])
+@jwt_required()
+def logout():
+    """
+    Logout
+    ---
+    tags:
+      - User
+    summary: "End the current session"
+    description: "Revokes the JWT the request is made with and the refresh tokens of its session; other sessions of the user stay valid."
+    responses:
+      200:
+        description: "Logout successful"
+      400:
+        description: "Revocation failed"
+      401:
+        description: "Unauthorized, JWT required"
+    """
+    token = get_jwt()
+    if "fam" in token:
+        auth_Blueprint.sessions.end(token["fam"])
+    if auth_Blueprint.revocations.revoke_token(
+        token["jti"], current_user.id, token["exp"]
+    ):
+        return jsonify({"msg": "Logout successful"}), 200
+    else:
+        return jsonify({"msg": "Logout not successful"}), 400
+
+
+@auth_Blueprint.route("/logout/all", methods=["POST"])
+@jwt_required()
+def logout_all():
+    """
+    Logout everywhere
+    ---
+    tags:
+      - User
+    summary: "Revoke every session of the user"
+    description: "Revokes all tokens issued to the user so far, including the one the request is made with."
+    responses:
+      200:
+        description: "All sessions revoked"
+      400:
+        description: "Revocation failed"
+      401:
+        description: "Unauthorized, JWT required"
+    """
+    auth_Blueprint.sessions.end_all(current_user.id)
+    if auth_Blueprint.revocations.revoke_all(current_user.id, max_token_lifetime()):
+        return jsonify({"msg": "All sessions revoked"}), 200
+    else:
+        return jsonify({"msg": "Logout not successful"}), 400
+
+
+@auth_Blueprint.route("/refresh", methods=["POST"])
+@jwt_required(refresh=True)
+def refresh():
+    """
+    Refresh tokens
+    ---
+    tags:
+      - User
+    summary: "Exchange a refresh token for a new token pair"
+    description: "Send the refresh token as the Bearer token. It is consumed and a new access and refresh token are returned; presenting a consumed refresh token again revokes every session of the user."
+    responses:
+      200:
+        description: "Refresh successful"
+        schema:
+          type: object
+          properties:
+            msg:
+              type: string
+              example: "Refresh success"
+            access_token:
+              type: string
+            refresh_token:
+              type: string
+      401:
+        description: "Refresh token invalid, revoked or reused"
+    """
+    token = get_jwt()
+    try:
+        tokens = auth_Blueprint.sessions.rotate(token)
+    except RefreshTokenReused:
+        auth_Blueprint.sessions.end_all(current_user.id)
+        auth_Blueprint.revocations.revoke_all(current_user.id, max_token_lifetime())
+        return jsonify({"msg": "Refresh token reuse detected"}), 401
+    if tokens is None:
+        return jsonify({"msg": "Invalid refresh token"}), 401
+    return (
+        jsonify(
+            {
+                "msg": "Refresh success",
+                "access_token": tokens[0],
+                "refresh_token": tokens[1],
+            }
+        ),
+        200,
+    )
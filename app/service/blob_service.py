@@ -0,0 +1,92 @@
+from app import db
+from app.models.blobs import Blobs
+import sqlalchemy as sa
+import time
+
+
+class BlobsService:
+    """
+    Reference counts of stored blobs, one per photo that points at the blob.
+    retain/release run inside the caller's transaction and do not commit, so
+    the count always changes together with the photos row.
+    """
+
+    def retain(self, sha256, size, content_type):
+        dialect = db.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        db.session.execute(
+            insert(Blobs)
+            .values(sha256=sha256, size=size, content_type=content_type, refcount=1)
+            .on_conflict_do_update(
+                index_elements=[Blobs.sha256],
+                set_={"refcount": Blobs.refcount + 1},
+            )
+        )
+
+    def release(self, counts):
+        """
+        Drops `counts[sha256]` references from each blob and deletes rows that
+        reach zero. Files are left for collect_garbage, which only removes
+        them once they have been unreferenced for a grace period; deleting
+        them here would race with a concurrent upload of the same bytes.
+        """
+        if not counts:
+            return
+        blobs = Blobs.__table__
+        db.session.execute(
+            blobs.update()
+            .where(blobs.c.sha256 == sa.bindparam("blob_sha256"))
+            .values(refcount=blobs.c.refcount - sa.bindparam("blob_refs")),
+            [
+                {"blob_sha256": sha256, "blob_refs": refs}
+                for sha256, refs in counts.items()
+            ],
+        )
+        db.session.execute(
+            blobs.delete().where(
+                blobs.c.sha256.in_(list(counts)), blobs.c.refcount <= 0
+            )
+        )
+
+    def collect_garbage(self, storage, grace_seconds, batch_size=500):
+        """
+        Deletes stored files that have no blobs row and were not touched for
+        grace_seconds. Returns the count. An upload of the same bytes touches
+        the file before it commits its reference, so the mtime is checked
+        again right before each delete, after the blobs lookup.
+        """
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        batch = []
+
+        def sweep(candidates):
+            known = set(
+                db.session.execute(
+                    sa.select(Blobs.sha256).where(Blobs.sha256.in_(candidates))
+                ).scalars()
+            )
+            deleted = 0
+            for sha256 in candidates:
+                if sha256 in known:
+                    continue
+                mtime = storage.mtime(sha256)
+                if mtime is None or mtime > cutoff:
+                    continue
+                storage.delete(sha256)
+                deleted += 1
+            return deleted
+
+        for sha256, mtime in storage.iter_blobs():
+            if mtime > cutoff:
+                continue
+            batch.append(sha256)
+            if len(batch) >= batch_size:
+                removed += sweep(batch)
+                batch = []
+        if batch:
+            removed += sweep(batch)
+        return removed
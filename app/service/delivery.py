@@ -0,0 +1,124 @@
+from flask import Response, request, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+import secrets
+
+# Blob content never changes under a given hash, but photos are private.
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+
+def blob_response(
+    storage, content_hash, content_type, size, offload=None, accel_prefix="/"
+):
+    """
+    Builds the response for a stored blob with a strong ETag (the content
+    hash), If-None-Match -> 304 and Range support.
+
+    offload="x-accel-redirect" or "x-sendfile" hands the transfer, including
+    ranges, to the front proxy; otherwise local files go through
+    wsgi.file_wrapper, which gunicorn serves with sendfile(2).
+    """
+    if offload:
+        response = Response(status=200, mimetype=content_type)
+        response.set_etag(content_hash)
+        if offload == "x-accel-redirect":
+            response.headers["X-Accel-Redirect"] = accel_prefix + storage.blob_key(
+                content_hash
+            )
+        else:
+            response.headers["X-Sendfile"] = storage.local_path(content_hash)
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            response.headers.pop("X-Accel-Redirect", None)
+            response.headers.pop("X-Sendfile", None)
+        return _cacheable(response)
+
+    if _is_multi_range(content_hash):
+        return _cacheable(
+            _multi_range_response(storage, content_hash, content_type, size)
+        )
+
+    path = storage.local_path(content_hash)
+    response = send_file(
+        path if path is not None else storage.open(content_hash),
+        mimetype=content_type,
+        conditional=True,
+        etag=content_hash,
+    )
+    return _cacheable(response)
+
+
+def _cacheable(response):
+    response.cache_control.no_cache = None
+    response.cache_control.public = None
+    response.cache_control.private = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def _is_multi_range(content_hash):
+    # Werkzeug only serves single ranges; several ranges need a
+    # multipart/byteranges body, unless a 304 or a stale If-Range wins.
+    if request.range is None or len(request.range.ranges) < 2:
+        return False
+    if request.if_none_match.contains(content_hash):
+        return False
+    if_range = request.if_range
+    if if_range.etag is not None or if_range.date is not None:
+        return if_range.etag == content_hash
+    return True
+
+
+def _multi_range_response(storage, content_hash, content_type, size):
+    ranges = []
+    for begin, end in request.range.ranges:
+        if begin < 0:
+            begin, end = max(size + begin, 0), size
+        elif end is None or end > size:
+            end = size
+        if begin < end:
+            ranges.append((begin, end))
+    if not ranges:
+        raise RequestedRangeNotSatisfiable(length=size)
+
+    boundary = secrets.token_hex(16)
+    parts = [
+        (
+            begin,
+            end,
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {begin}-{end - 1}/{size}\r\n\r\n"
+            ).encode(),
+        )
+        for begin, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    length = sum(len(header) + end - begin + 2 for begin, end, header in parts)
+
+    def generate():
+        with storage.open(content_hash) as blob:
+            for begin, end, header in parts:
+                yield header
+                blob.seek(begin)
+                remaining = end - begin
+                while remaining:
+                    chunk = blob.read(min(remaining, 64 * 1024))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+                yield b"\r\n"
+            yield closing
+
+    response = Response(
+        generate(),
+        206,
+        mimetype=f"multipart/byteranges; boundary={boundary}",
+        direct_passthrough=True,
+    )
+    response.content_length = length + len(closing)
+    response.headers["Accept-Ranges"] = "bytes"
+    response.set_etag(content_hash)
+    return response
@@ -0,0 +1,56 @@
+import threading
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.results = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class GroupCommitter:
+    """
+    Coalesces writes from concurrent requests into one transaction.
+
+    The first caller to find no open batch becomes its leader: it waits up
+    to `window` seconds, or until `max_batch` items have joined, then runs
+    flush(items) on its own thread (and so in its own request's session).
+    The other callers block until the flush is done. flush must return one
+    result per item, in order; if it raises, every item gets False.
+    """
+
+    def __init__(self, flush, window, max_batch):
+        self.flush = flush
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._open = None
+
+    def submit(self, item):
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch:
+                self._open = None
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+            return batch.results[index]
+
+        batch.full.wait(self.window)
+        with self._lock:
+            if self._open is batch:
+                self._open = None
+        try:
+            batch.results = self.flush(batch.items)
+        finally:
+            if batch.results is None:
+                batch.results = [False] * len(batch.items)
+            batch.done.set()
+        return batch.results[index]
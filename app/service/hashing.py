@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from argon2 import PasswordHasher
+import os
+import statistics
+import threading
+import time
+
+# Never calibrate below this much memory (KiB), whatever the target.
+MIN_MEMORY_COST = 8 * 1024
+MAX_TIME_COST = 10
+
+# Named argon2 cost profiles, selected by PASSWORD_HASHER_PROFILE. "default"
+# is argon2-cffi's own RFC 9106 low-memory setting; "fast" is the cheapest
+# cost argon2 accepts and is meant for test suites only.
+HASHER_PROFILES = {
+    "default": {"time_cost": 3, "memory_cost": 64 * 1024, "parallelism": 4},
+    "fast": {"time_cost": 1, "memory_cost": 8, "parallelism": 1},
+}
+
+
+def default_pool_workers(parallelism, processes, cores=None):
+    """
+    HashingPool size that keeps all processes' argon2 lanes within the
+    host's cores: each hash runs `parallelism` lanes, and every one of the
+    `processes` serving processes (gunicorn workers) has its own pool.
+    """
+    cores = cores or os.cpu_count() or 1
+    return max(1, cores // (max(1, processes) * max(1, parallelism)))
+
+
+class HashingUnavailable(Exception):
+    """The hashing pool is saturated or the call ran out of time."""
+
+
+class HashingPool:
+    """
+    Runs argon2 hash/verify on a dedicated, bounded thread pool.
+
+    argon2-cffi releases the GIL while hashing, so threads are enough to keep
+    the work off the request thread. At most `workers` hashes run at once and
+    at most `queue_size` more wait for a worker; anything beyond that is
+    rejected immediately instead of piling up behind a login burst. The
+    bounds are per process: every gunicorn worker has a pool of its own.
+    """
+
+    def __init__(self, hasher, workers, queue_size, timeout):
+        self.hasher = hasher
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="argon2"
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+
+    def hash(self, password):
+        return self._run(self.hasher.hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(self.hasher.verify, password_hash, password)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+            }
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingUnavailable("Hashing queue is full")
+
+        with self._lock:
+            self._in_flight += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The job keeps its slot until it actually finishes, so timed out
+            # work still counts against the queue bound.
+            with self._lock:
+                self._timeouts += 1
+            raise HashingUnavailable("Hashing timed out")
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+        self._slots.release()
+
+
+def measure_hash_ms(time_cost, memory_cost, parallelism, samples=3):
+    hasher = PasswordHasher(
+        time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism
+    )
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hasher.hash("calibration password")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms, max_memory_cost=64 * 1024, parallelism=4, samples=3):
+    """
+    Benchmarks this host and returns argon2 parameters whose hash takes at
+    most target_ms. Memory is the preferred cost, so it is reduced only until
+    a single pass fits the target; the remaining budget goes to time_cost.
+    """
+    memory_cost = max(max_memory_cost, MIN_MEMORY_COST)
+    while (
+        memory_cost > MIN_MEMORY_COST
+        and measure_hash_ms(1, memory_cost, parallelism, samples) > target_ms
+    ):
+        memory_cost = max(memory_cost // 2, MIN_MEMORY_COST)
+
+    time_cost = 1
+    measured = measure_hash_ms(time_cost, memory_cost, parallelism, samples)
+    while time_cost < MAX_TIME_COST:
+        candidate = measure_hash_ms(time_cost + 1, memory_cost, parallelism, samples)
+        if candidate > target_ms:
+            break
+        time_cost += 1
+        measured = candidate
+
+    return {
+        "time_cost": time_cost,
+        "memory_cost": memory_cost,
+        "parallelism": parallelism,
+        "measured_ms": round(measured, 2),
+    }
+
+
+def hasher_params(config):
+    """
+    Resolves the argon2 parameters of the PASSWORD_HASHER_PROFILE profile,
+    with any ARGON2_* setting that is set overriding the profile's value.
+    """
+    profile = config.get("PASSWORD_HASHER_PROFILE", "default")
+    if profile not in HASHER_PROFILES:
+        raise ValueError(f"Unknown password hasher profile: {profile}")
+    params = dict(HASHER_PROFILES[profile])
+    for name in params:
+        value = config.get(f"ARGON2_{name.upper()}")
+        if value:
+            params[name] = value
+    return params
+
+
+def make_hasher(config):
+    """
+    Builds the PasswordHasher from hasher_params. The parameters are never
+    measured at startup: every process and host must agree on them, or
+    check_needs_rehash would keep flagging the others' hashes.
+    """
+    params = hasher_params(config)
+    return PasswordHasher(
+        time_cost=params["time_cost"],
+        memory_cost=params["memory_cost"],
+        parallelism=params["parallelism"],
+    )
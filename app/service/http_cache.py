@@ -0,0 +1,72 @@
+from flask import request, make_response
+import datetime
+import functools
+import hashlib
+
+
+def conditional(validator=None, cache_control="private, no-cache"):
+    """
+    Adds ETag/Last-Modified validators and a Cache-Control policy to a JSON
+    GET view.
+
+    `validator(*args, **kwargs)` gets the view's arguments and returns
+    (version, last_modified) from cheap metadata such as row counts or
+    timestamps; either may be None. It runs before the view, so a matching
+    If-None-Match/If-Modified-Since is answered with 304 without building
+    the body. Without a validator, or when it returns None, the ETag falls
+    back to a hash of the serialized body.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+
+            validators = validator(*args, **kwargs) if validator else None
+            if validators is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    response.add_etag()
+                    response = response.make_conditional(request)
+                return _with_policy(response, cache_control)
+
+            version, last_modified = validators
+            etag = None
+            if version is not None:
+                # The query string picks the page, so it is part of the ETag.
+                etag = hashlib.sha256(
+                    f"{version}|{request.query_string.decode()}".encode()
+                ).hexdigest()[:32]
+            if last_modified is not None and last_modified.tzinfo is None:
+                last_modified = last_modified.replace(tzinfo=datetime.timezone.utc)
+
+            if _not_modified(etag, last_modified):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            if etag is not None:
+                response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return _with_policy(response, cache_control)
+
+        return wrapper
+
+    return decorator
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return etag is not None and request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def _with_policy(response, cache_control):
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+    return response
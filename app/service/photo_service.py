@@ -1,39 +1,303 @@
 from app import db
 from app.models.photos import Photos
+from app.models.blobs import Blobs
+from app.service.blob_service import BlobsService
+from app.service.cache import TTLCache, MISSING
+from app.service.group_commit import GroupCommitter
+from app.service.replicas import mark_write, replica_read
+from app.service.search_index import PhotoSearchIndex
+from app.service.storage import make_storage
+import sqlalchemy as sa
+import base64
+import dataclasses
+import datetime
+import json
 import uuid
 
+# Keyset positions of the photo list (newest first) and of search results
+# (best match first), as the types decode_cursor parses them into.
+LIST_CURSOR = (datetime.datetime, str)
+SEARCH_CURSOR = (float, str)
+
+
+def encode_cursor(*key):
+    """Opaque cursor for a keyset position such as (created_at, id)."""
+    values = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in key
+    ]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, types):
+    """
+    Parses an encode_cursor cursor into a tuple of `types`, e.g.
+    LIST_CURSOR. Raises ValueError on a malformed cursor.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(types):
+            raise ValueError("Invalid cursor")
+        return tuple(
+            (
+                datetime.datetime.fromisoformat(value)
+                if kind is datetime.datetime
+                else kind(value)
+            )
+            for kind, value in zip(types, values)
+        )
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+@dataclasses.dataclass(frozen=True)
+class PhotoRecord:
+    """Detached, read-only snapshot of a photos row, safe to cache."""
+
+    id: str
+    user_id: str
+    photo_url: str
+    description: str
+    created_at: datetime.datetime
+    content_hash: str
+    content_type: str
+    size: int
+
 
 class PhotosService:
-    def insert_photo(self, user_id, photo_url, description) -> bool:
-        try:
-            new_photo = Photos(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                photo_url=photo_url,
-                description=description,
+    def __init__(self, config=None):
+        config = config or {}
+        self.cache = TTLCache(
+            config.get("PHOTO_CACHE_SIZE", 1024), config.get("PHOTO_CACHE_TTL", 60)
+        )
+        self.storage = make_storage(config)
+        self.blobs = BlobsService()
+        self.search_index = PhotoSearchIndex()
+        self.max_upload_size = config.get("PHOTO_MAX_UPLOAD_BYTES", 20 * 1024 * 1024)
+        self.group_commit = None
+        window_ms = config.get("PHOTO_GROUP_COMMIT_WINDOW_MS", 0)
+        if window_ms:
+            self.group_commit = GroupCommitter(
+                self._flush_group,
+                window=window_ms / 1000,
+                max_batch=config.get("PHOTO_GROUP_COMMIT_MAX_BATCH", 64),
             )
-            db.session.add(new_photo)
+
+    def insert_photo(
+        self,
+        user_id,
+        photo_url,
+        description,
+        photo_id=None,
+        content_hash=None,
+        size=None,
+        content_type=None,
+    ) -> bool:
+        """
+        Inserts a photo. Uploaded photos pass the content_hash, size and
+        content_type of their stored blob, whose reference count is taken in
+        the same transaction. With group commit on, the photo is written
+        together with those of concurrent callers.
+        """
+        item = (
+            {
+                "id": photo_id or str(uuid.uuid4()),
+                "user_id": user_id,
+                "photo_url": photo_url,
+                "description": description,
+                "content_hash": content_hash,
+            },
+            (content_hash, size, content_type) if content_hash is not None else None,
+        )
+        if self.group_commit is not None:
+            return self.group_commit.submit(item)
+        return self._insert_items([item])[0]
+
+    def insert_photos(self, user_id, items):
+        """
+        Inserts (photo_url, description) pairs with a single multi-row
+        INSERT in one transaction. Returns the new ids in input order, or
+        False if the transaction failed and nothing was written.
+        """
+        rows = [
+            (
+                {
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "photo_url": photo_url,
+                    "description": description,
+                    "content_hash": None,
+                },
+                None,
+            )
+            for photo_url, description in items
+        ]
+        if not rows:
+            return []
+        ids = self._insert_items(rows)
+        return ids if all(ids) else False
+
+    def _insert_items(self, items):
+        """
+        Writes (row, blob) items in one transaction: blob references, one
+        executemany INSERT and the search entries. Returns the ids in input
+        order, or [False, ...] if the transaction failed.
+        """
+        rows = [row for row, _ in items]
+        try:
+            for _, blob in items:
+                if blob is not None:
+                    self.blobs.retain(*blob)
+            db.session.execute(sa.insert(Photos), rows)
+            self.search_index.add(rows)
             db.session.commit()
-            return new_photo.id
         except:
             db.session.rollback()
-            return False
+            return [False] * len(rows)
+        for row in rows:
+            self.cache.invalidate(row["id"])
+        mark_write(*{row["user_id"] for row in rows})
+        return [row["id"] for row in rows]
 
-    def delete_photo(self, photo) -> bool:
+    def _flush_group(self, items):
+        """
+        GroupCommitter flush: the whole group in one transaction, or, if that
+        fails, each item on its own so one bad row only fails its own caller.
+        """
+        ids = self._insert_items(items)
+        if len(items) == 1 or all(ids):
+            return ids
+        return [self._insert_items([item])[0] for item in items]
+
+    def delete_photo(self, photo_id, user_id):
+        """
+        Deletes the photo only if user_id owns it, in one statement. Returns
+        True when deleted, None when there is no such photo for this user and
+        False on database error.
+        """
         try:
-            db.session.delete(photo)
+            deleted = db.session.execute(
+                sa.delete(Photos)
+                .where(Photos.id == photo_id, Photos.user_id == user_id)
+                .returning(Photos.id, Photos.content_hash)
+            ).first()
+            if deleted is not None:
+                self.search_index.remove([deleted.id])
+                if deleted.content_hash is not None:
+                    self.blobs.release({deleted.content_hash: 1})
             db.session.commit()
-            return True
         except:
             db.session.rollback()
             return False
+        self.cache.invalidate(photo_id)
+        mark_write(user_id)
+        return True if deleted is not None else None
+
+    def get_photo_by_id(self, photo_id, reader_id=None):
+        """
+        Returns a PhotoRecord or None. Lookups, including misses (which the
+        primary confirms when a replica finds nothing), are cached for
+        PHOTO_CACHE_TTL seconds. reader_id keeps the read on the primary
+        right after that user wrote.
+        """
+        if photo_id is None:
+            return None
+
+        record = self.cache.get(photo_id)
+        if record is not MISSING:
+            return record
 
-    def get_photo_by_id(self, photo_id):
         try:
-            return (
-                db.session.query(Photos)
-                .filter(Photos.id == photo_id if photo_id is not None else False)
-                .first()
+            row = replica_read(
+                sa.select(
+                    Photos.id,
+                    Photos.user_id,
+                    Photos.photo_url,
+                    Photos.description,
+                    Photos.created_at,
+                    Photos.content_hash,
+                    Blobs.content_type,
+                    Blobs.size,
+                )
+                .outerjoin(Blobs, Blobs.sha256 == Photos.content_hash)
+                .where(Photos.id == photo_id),
+                lambda result: result.first(),
+                keys=(reader_id,),
             )
         except:
+            db.session.rollback()
             return None
+
+        record = PhotoRecord(**row._asdict()) if row is not None else None
+        self.cache.set(photo_id, record)
+        return record
+
+    def get_user_photos(self, user_id, limit, cursor=None):
+        """
+        Returns one page of the user's photos, newest first, and the cursor
+        of the next page (None on the last page), or None on database error.
+
+        Keyset pagination over (created_at, id) walks idx_user_id, so every
+        page costs the same regardless of its depth. Only plain columns are
+        selected, which also skips the joined load of Photos.user.
+        """
+        query = (
+            sa.select(
+                Photos.id, Photos.photo_url, Photos.description, Photos.created_at
+            )
+            .where(Photos.user_id == user_id)
+            .order_by(Photos.created_at.desc(), Photos.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor is not None:
+            query = query.where(
+                sa.tuple_(Photos.created_at, Photos.id) < sa.tuple_(*cursor)
+            )
+
+        try:
+            rows = db.session.execute(query).all()
+        except:
+            db.session.rollback()
+            return None
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        return rows, next_cursor
+
+    def search_user_photos(self, user_id, query, limit, cursor=None):
+        """
+        Full-text search over the user's photo descriptions, best match
+        first. Returns (rows, next_cursor), or None on database error.
+        """
+        try:
+            rows = self.search_index.search(user_id, query, limit + 1, cursor)
+        except:
+            db.session.rollback()
+            return None
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].rank, rows[-1].id)
+        return rows, next_cursor
+
+    def iter_user_photos(self, user_id, batch_size=1000):
+        """
+        Yields every photo row of the user, oldest first. yield_per streams
+        the result through a server-side cursor in batch_size chunks, so
+        memory stays flat however many photos there are.
+        """
+        result = db.session.execute(
+            sa.select(
+                Photos.id, Photos.photo_url, Photos.description, Photos.created_at
+            )
+            .where(Photos.user_id == user_id)
+            .order_by(Photos.created_at, Photos.id)
+            .execution_options(yield_per=batch_size)
+        )
+        try:
+            yield from result
+        finally:
+            result.close()
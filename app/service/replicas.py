@@ -0,0 +1,131 @@
+from app import db
+from app.service.cache import TTLCache, MISSING
+from flask import current_app, g, has_app_context, request
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+import itertools
+import threading
+import time
+
+
+class ReplicaRouter:
+    """
+    Sends read-only lookups to the SQLALCHEMY_BINDS replicas (binds named
+    replica_*) and everything else to the primary.
+
+    Users see their own writes despite replication lag: a response to a
+    request that wrote sets the REPLICA_PIN_COOKIE cookie, and requests
+    carrying it read from the primary for REPLICA_STICKY_SECONDS, whichever
+    worker serves them. Within a process, reads keyed by a user who just
+    wrote also stay on the primary. A lookup that finds no row on a replica
+    is retried on the primary, as the row may be newer than the replica.
+    A replica that fails a query is skipped for REPLICA_RETRY_SECONDS and
+    the read is retried on the primary.
+    """
+
+    def __init__(self, config):
+        self.binds = sorted(
+            name
+            for name in (config.get("SQLALCHEMY_BINDS") or {})
+            if name.startswith("replica")
+        )
+        self.sticky = TTLCache(
+            config.get("REPLICA_STICKY_SIZE", 10000),
+            config.get("REPLICA_STICKY_SECONDS", 5.0),
+        )
+        self.retry_after = config.get("REPLICA_RETRY_SECONDS", 30.0)
+        self.sticky_seconds = config.get("REPLICA_STICKY_SECONDS", 5.0)
+        self.pin_cookie = config.get("REPLICA_PIN_COOKIE", "primary_until")
+        self._down_until = {}
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def mark_write(self, keys):
+        for key in keys:
+            if key is not None:
+                self.sticky.set(key, True)
+        if has_app_context():
+            g.replica_pinned = True
+            g.replica_wrote = True
+
+    def pin_request(self):
+        """before_request: pins the request if the client wrote recently."""
+        try:
+            until = float(request.cookies.get(self.pin_cookie, 0))
+        except ValueError:
+            until = 0
+        g.replica_pinned = until > time.time()
+
+    def pin_client(self, response):
+        """after_request: after a write, pins the client's next requests."""
+        if g.pop("replica_wrote", False):
+            response.set_cookie(
+                self.pin_cookie,
+                str(int(time.time() + self.sticky_seconds) + 1),
+                max_age=int(self.sticky_seconds) + 1,
+                secure=request.is_secure,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def choose(self, keys):
+        """Name of the replica bind to read from, or None for the primary."""
+        if not self.binds or g.get("replica_pinned"):
+            return None
+        if any(self.sticky.get(key) is not MISSING for key in keys):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            healthy = [b for b in self.binds if self._down_until.get(b, 0) <= now]
+            if not healthy:
+                return None
+            return healthy[next(self._turn) % len(healthy)]
+
+    def read(self, statement, fetch, keys=()):
+        """
+        Runs a SELECT and returns fetch(result). On a replica the session is
+        closed before returning, so ORM objects come back detached with their
+        columns loaded. A None from a replica is retried on the primary.
+        """
+        bind = self.choose(keys)
+        if bind is not None:
+            try:
+                with so.Session(db.engines[bind], expire_on_commit=False) as session:
+                    found = fetch(session.execute(statement))
+                if found is not None:
+                    return found
+            except sa.exc.DBAPIError:
+                with self._lock:
+                    self._down_until[bind] = time.monotonic() + self.retry_after
+        return fetch(db.session.execute(statement))
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                bind: {"healthy": self._down_until.get(bind, 0) <= now}
+                for bind in self.binds
+            }
+
+
+def init_replicas(flask_app):
+    router = flask_app.extensions["replicas"] = ReplicaRouter(flask_app.config)
+    if router.binds:
+        flask_app.before_request(router.pin_request)
+        flask_app.after_request(router.pin_client)
+
+
+def replica_read(statement, fetch, keys=()):
+    """ReplicaRouter.read of the current app; the primary if there is none."""
+    router = current_app.extensions.get("replicas") if has_app_context() else None
+    if router is None:
+        return fetch(db.session.execute(statement))
+    return router.read(statement, fetch, keys)
+
+
+def mark_write(*keys):
+    """Pins reads keyed by any of keys to the primary for a while."""
+    router = current_app.extensions.get("replicas") if has_app_context() else None
+    if router is not None:
+        router.mark_write(keys)
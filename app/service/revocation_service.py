@@ -0,0 +1,194 @@
+from app import db
+from app.models.revoked_tokens import RevokedTokens
+from flask import current_app
+import sqlalchemy as sa
+import os
+import threading
+import time
+
+
+def now_ms():
+    return time.time_ns() // 1_000_000
+
+
+class RevocationService:
+    """
+    Answers "is this JWT revoked?" from memory. The revoked_tokens table is
+    the source of truth; each process mirrors the still-relevant rows as a
+    set of revoked jtis and a per-user "issued before" cutoff. A background
+    thread per process pulls rows newer than its watermark every
+    refresh_interval seconds on a connection of its own, so token checks
+    never touch the database. Revocations made by this process apply
+    immediately, those made by other processes within refresh_interval.
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        # 0 runs no poller; the mirror then only changes through refresh().
+        self.refresh_interval = config.get("REVOCATION_REFRESH_SECONDS", 1.0)
+        # Rows are polled by revoked_at, which is stamped before the commit;
+        # re-read this far back so rows committed late are not skipped.
+        self.refresh_lag_ms = int(config.get("REVOCATION_REFRESH_LAG", 5.0) * 1000)
+        self._lock = threading.Lock()
+        self._jtis = {}
+        self._cutoffs = {}
+        self._watermark = None
+        self._start_lock = threading.Lock()
+        self._poller_pid = None
+        self._poller = None
+        self._stopping = threading.Event()
+
+    def is_revoked(self, jwt_data):
+        if self.refresh_interval and self._poller_pid != os.getpid():
+            # Not started after fork (dev server, flask run): poll from now
+            # on; the first load happens on the poller thread too.
+            self.start(current_app._get_current_object(), load=False)
+        if jwt_data.get("jti") in self._jtis:
+            return True
+        cutoff = self._cutoffs.get(jwt_data.get("sub"))
+        if cutoff is None:
+            return False
+        return jwt_data.get("iat_ms", jwt_data.get("iat", 0) * 1000) < cutoff[0]
+
+    def revoke_token(self, jti, user_id, expires_at):
+        """Revokes one token until its exp (epoch seconds). Returns success."""
+        return self._insert(
+            {"user_id": user_id, "jti": jti, "expires_at": int(expires_at)}
+        )
+
+    def revoke_all(self, user_id, lifetime_seconds):
+        """
+        Revokes every token of the user issued until now. lifetime_seconds
+        is the longest lifetime such a token can have. Returns success.
+        """
+        return self._insert(
+            {
+                "user_id": user_id,
+                "issued_before": now_ms(),
+                "expires_at": int(time.time() + lifetime_seconds),
+            }
+        )
+
+    def start(self, flask_app, load=True):
+        """
+        Starts this process's poller thread, once per process; gunicorn
+        calls it in each worker after fork. With load, the revocations
+        recorded so far are read before returning, so the worker never
+        serves from an empty mirror.
+        """
+        with self._start_lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+        if load:
+            with flask_app.app_context():
+                self._refresh_on_own_connection()
+        if self.refresh_interval:
+            self._stopping.clear()
+            self._poller = threading.Thread(
+                target=self._poll,
+                args=(flask_app, not load),
+                name="revocations",
+                daemon=True,
+            )
+            self._poller.start()
+
+    def stop(self):
+        """Stops the poller thread and waits for it to exit."""
+        self._stopping.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+    def refresh(self, connection=None):
+        """
+        Pulls revocations recorded since the last refresh into memory, on
+        the given connection or else the current db.session.
+        """
+        executor = connection if connection is not None else db.session
+        query = sa.select(
+            RevokedTokens.user_id,
+            RevokedTokens.jti,
+            RevokedTokens.issued_before,
+            RevokedTokens.expires_at,
+            RevokedTokens.revoked_at,
+        ).where(RevokedTokens.expires_at > int(time.time()))
+        if self._watermark is not None:
+            query = query.where(
+                RevokedTokens.revoked_at > self._watermark - self.refresh_lag_ms
+            )
+        try:
+            rows = executor.execute(query).all()
+        except:
+            # Keep serving from the last known state; retry next interval.
+            executor.rollback()
+            return False
+
+        with self._lock:
+            for row in rows:
+                self._apply(row.user_id, row.jti, row.issued_before, row.expires_at)
+                if self._watermark is None or row.revoked_at > self._watermark:
+                    self._watermark = row.revoked_at
+            if self._watermark is None:
+                self._watermark = now_ms()
+            self._prune()
+        return True
+
+    def _poll(self, flask_app, load_first):
+        with flask_app.app_context():
+            if load_first:
+                self._refresh_on_own_connection()
+            while not self._stopping.wait(self.refresh_interval):
+                self._refresh_on_own_connection()
+
+    def _refresh_on_own_connection(self):
+        try:
+            with db.engine.connect() as connection:
+                return self.refresh(connection)
+        except sa.exc.DBAPIError:
+            # Database unreachable: keep the last known state.
+            return False
+
+    def purge_expired(self):
+        """Deletes rows no token can be covered by any more. Returns the count."""
+        result = db.session.execute(
+            sa.delete(RevokedTokens).where(RevokedTokens.expires_at <= int(time.time()))
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def _insert(self, values):
+        values["revoked_at"] = now_ms()
+        try:
+            db.session.execute(sa.insert(RevokedTokens).values(values))
+            db.session.commit()
+        except:
+            db.session.rollback()
+            return False
+        with self._lock:
+            self._apply(
+                values["user_id"],
+                values.get("jti"),
+                values.get("issued_before"),
+                values["expires_at"],
+            )
+        return True
+
+    def _apply(self, user_id, jti, issued_before, expires_at):
+        if jti is not None:
+            self._jtis[jti] = expires_at
+        if issued_before is not None:
+            cutoff = self._cutoffs.get(user_id, (0, 0))
+            self._cutoffs[user_id] = (
+                max(cutoff[0], issued_before),
+                max(cutoff[1], expires_at),
+            )
+
+    def _prune(self):
+        now = time.time()
+        self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+        self._cutoffs = {
+            user_id: cutoff
+            for user_id, cutoff in self._cutoffs.items()
+            if cutoff[1] > now
+        }
@@ -0,0 +1,116 @@
+from app import db
+from app.models.photos import Photos
+import sqlalchemy as sa
+
+# Text search configuration of the Postgres index; "simple" does no
+# language-specific stemming, so descriptions in any language match as typed.
+TS_CONFIG = "simple"
+
+POSTGRES_DDL = (
+    "ALTER TABLE photos ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}', coalesce(description, ''))) "
+    "STORED",
+    "CREATE INDEX IF NOT EXISTS ix_photos_search_vector "
+    "ON photos USING GIN (search_vector)",
+)
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS photos_fts "
+    "USING fts5(description, photo_id UNINDEXED, user_id UNINDEXED)",
+)
+
+
+@sa.event.listens_for(Photos.__table__, "after_create")
+def create_search_index(target, connection, **kw):
+    ddl = {"postgresql": POSTGRES_DDL, "sqlite": SQLITE_DDL}
+    for statement in ddl.get(connection.dialect.name, ()):
+        connection.execute(sa.text(statement))
+
+
+@sa.event.listens_for(Photos.__table__, "after_drop")
+def drop_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(sa.text("DROP TABLE IF EXISTS photos_fts"))
+
+
+class PhotoSearchIndex:
+    """
+    Full-text index over photo descriptions.
+
+    On Postgres the index is a generated tsvector column with a GIN index,
+    which the database keeps current by itself. On SQLite it is the FTS5
+    table photos_fts, which PhotosService/UsersService update in the same
+    transaction as the photos rows. Methods do not commit.
+    """
+
+    def _sqlite(self):
+        return db.session.get_bind().dialect.name == "sqlite"
+
+    def add(self, rows):
+        """rows: dicts with id, user_id and description."""
+        rows = [row for row in rows if row["description"]]
+        if rows and self._sqlite():
+            db.session.execute(
+                sa.text(
+                    "INSERT INTO photos_fts (description, photo_id, user_id) "
+                    "VALUES (:description, :id, :user_id)"
+                ),
+                rows,
+            )
+
+    def remove(self, photo_ids):
+        if photo_ids and self._sqlite():
+            db.session.execute(
+                sa.text("DELETE FROM photos_fts WHERE photo_id = :photo_id"),
+                [{"photo_id": photo_id} for photo_id in photo_ids],
+            )
+
+    def remove_user(self, user_id):
+        if self._sqlite():
+            db.session.execute(
+                sa.text("DELETE FROM photos_fts WHERE user_id = :user_id"),
+                {"user_id": user_id},
+            )
+
+    def search(self, user_id, query, limit, cursor=None):
+        """
+        Returns up to `limit` of the user's photos matching every word of
+        `query`, best match first, as rows with a `rank` column. `cursor` is
+        the (rank, id) of the last row of the previous page.
+        """
+        params = {"user_id": user_id, "limit": limit}
+        if cursor is not None:
+            params["rank"], params["last_id"] = cursor
+        after = "WHERE (rank < :rank OR (rank = :rank AND id < :last_id))"
+
+        if self._sqlite():
+            # Quote each word so user input is never parsed as FTS5 syntax.
+            params["query"] = " ".join(
+                '"' + word.replace('"', '""') + '"' for word in query.split()
+            )
+            matches = (
+                "SELECT p.id, p.photo_url, p.description, p.created_at, "
+                "-bm25(photos_fts) AS rank "
+                "FROM photos_fts JOIN photos p ON p.id = photos_fts.photo_id "
+                "WHERE photos_fts MATCH :query AND p.user_id = :user_id"
+            )
+        else:
+            params["query"] = query
+            matches = (
+                "SELECT id, photo_url, description, created_at, "
+                "ts_rank(search_vector, q)::float8 AS rank "
+                f"FROM photos, plainto_tsquery('{TS_CONFIG}', :query) q "
+                "WHERE user_id = :user_id AND search_vector @@ q"
+            )
+
+        statement = sa.text(
+            f"SELECT * FROM ({matches}) matches "
+            f"{after if cursor is not None else ''} "
+            "ORDER BY rank DESC, id DESC LIMIT :limit"
+        ).columns(
+            id=sa.String,
+            photo_url=sa.String,
+            description=sa.Text,
+            created_at=sa.DateTime,
+            rank=sa.Float,
+        )
+        return db.session.execute(statement, params).all()
@@ -0,0 +1,130 @@
+from abc import ABC, abstractmethod
+import hashlib
+import os
+import tempfile
+
+
+class BlobTooLarge(Exception):
+    """The upload exceeded the configured size limit."""
+
+
+class StorageBackend(ABC):
+    """
+    Content-addressed blob storage: blobs are written once and named by the
+    SHA-256 of their bytes, so identical uploads share one copy. Reference
+    counting lives in the blobs table (see BlobsService); backends only move
+    bytes.
+    """
+
+    @abstractmethod
+    def save(self, stream, max_size=None):
+        """Consumes the stream and returns (sha256, size)."""
+
+    @abstractmethod
+    def open(self, sha256): ...
+
+    @abstractmethod
+    def exists(self, sha256): ...
+
+    @abstractmethod
+    def delete(self, sha256): ...
+
+    @abstractmethod
+    def mtime(self, sha256):
+        """Modification time of the blob, or None if it is not stored."""
+
+    @abstractmethod
+    def iter_blobs(self):
+        """Yields (sha256, mtime) of every stored blob."""
+
+    def local_path(self, sha256):
+        """Filesystem path of the blob, or None if the backend has none."""
+        return None
+
+    def blob_key(self, sha256):
+        """Location of the blob relative to the storage root."""
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root, chunk_size=64 * 1024):
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+        self._tmp = os.path.join(self.root, "tmp")
+
+    def _path(self, sha256):
+        return os.path.join(self.root, *self.blob_key(sha256).split("/"))
+
+    def save(self, stream, max_size=None):
+        # Created on first write, not at startup: serving and CLI processes
+        # that never store anything leave the filesystem alone.
+        os.makedirs(self._tmp, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLarge()
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+
+            sha256 = hasher.hexdigest()
+            path = self._path(sha256)
+            try:
+                # Same bytes may already be stored; refresh mtime so garbage
+                # collection leaves them alone until this reference commits.
+                os.utime(path)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            else:
+                os.remove(tmp_path)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, sha256):
+        return open(self._path(sha256), "rb")
+
+    def exists(self, sha256):
+        return os.path.exists(self._path(sha256))
+
+    def delete(self, sha256):
+        try:
+            os.remove(self._path(sha256))
+        except FileNotFoundError:
+            pass
+
+    def mtime(self, sha256):
+        try:
+            return os.path.getmtime(self._path(sha256))
+        except FileNotFoundError:
+            return None
+
+    def iter_blobs(self):
+        for directory, _, files in os.walk(self.root):
+            if directory.startswith(self._tmp):
+                continue
+            for name in files:
+                yield name, os.path.getmtime(os.path.join(directory, name))
+
+    def local_path(self, sha256):
+        return self._path(sha256)
+
+
+def make_storage(config):
+    backend = config.get("STORAGE_BACKEND", "local")
+    if backend == "local":
+        return LocalStorage(
+            config.get("STORAGE_ROOT", "storage"),
+            chunk_size=config.get("STORAGE_CHUNK_SIZE", 64 * 1024),
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -1,56 +1,208 @@
 from app import db
 from app.models.users import Users
-from argon2 import PasswordHasher
-from sqlalchemy import or_
+from app.monitoring.metrics import timed
+from app.models.photos import Photos
+from app.service.blob_service import BlobsService
+from app.service.cache import TTLCache, MISSING
+from app.service.search_index import PhotoSearchIndex
+from app.service.hashing import HashingPool, default_pool_workers, make_hasher
+from app.service.replicas import mark_write, replica_read
+from sqlalchemy.exc import IntegrityError
+import sqlalchemy as sa
+import collections
+import dataclasses
 import uuid
 
 
+@dataclasses.dataclass(frozen=True)
+class UserRecord:
+    """Detached, read-only snapshot of a users row, without the hash."""
+
+    id: str
+    username: str
+    email: str
+
+
+class UserExistsError(Exception):
+    """Registration hit a unique constraint; `field` is username or email."""
+
+    def __init__(self, field):
+        super().__init__(field)
+        self.field = field
+
+
 class UsersService:
-    def __init__(self):
-        self.hasher = PasswordHasher()
+    def __init__(self, config=None):
+        config = config or {}
+        self.purge_chunk_size = config.get("USER_PURGE_CHUNK_SIZE", 0)
+        self.blobs = BlobsService()
+        self.search_index = PhotoSearchIndex()
+        self.identity_cache = TTLCache(
+            config.get("USER_CACHE_SIZE", 1024), config.get("USER_CACHE_TTL", 60)
+        )
+        self.hasher = make_hasher(config)
+        self.hashing = HashingPool(
+            self.hasher,
+            workers=config.get("HASHING_POOL_WORKERS")
+            or default_pool_workers(
+                self.hasher.parallelism, config.get("WEB_WORKERS", 1)
+            ),
+            queue_size=config.get("HASHING_POOL_QUEUE_SIZE", 64),
+            timeout=config.get("HASHING_TIMEOUT", 5.0),
+        )
 
     def set_password(self, password):
-        return self.hasher.hash(password)
+        with timed("argon2"):
+            return self.hashing.hash(password)
 
     def check_password(self, password_hash, password):
-        return self.hasher.verify(password_hash, password)
+        with timed("argon2"):
+            return self.hashing.verify(password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return self.hasher.check_needs_rehash(password_hash)
+
+    # One lookup per unique column, so each query is a single index probe.
+    # Lookups may be served by a read replica; the keys are what a write
+    # marks to keep the next reads of the same user on the primary.
+    def find_user_by_username(self, username, primary=False):
+        return self._find_user(
+            Users.username == username, (f"username:{username}",), primary
+        )
+
+    def find_user_by_email(self, email, primary=False):
+        return self._find_user(Users.email == email, (f"email:{email}",), primary)
+
+    def _find_user(self, condition, keys, primary):
+        query = sa.select(Users).where(condition)
+        try:
+            if primary:
+                return db.session.execute(query).scalar()
+            return replica_read(query, lambda result: result.scalar(), keys)
+        except:
+            db.session.rollback()
+            return False
+
+    def get_user_record(self, user_id):
+        """
+        Resolves a JWT identity to a UserRecord, or None if the user is gone.
+        Lookups, including misses, are cached for USER_CACHE_TTL seconds.
+        """
+        record = self.identity_cache.get(user_id)
+        if record is not MISSING:
+            return record
+
+        try:
+            row = db.session.execute(
+                sa.select(Users.id, Users.username, Users.email).where(
+                    Users.id == user_id
+                )
+            ).first()
+        except:
+            db.session.rollback()
+            return None
 
-    def find_user(self, username=None, email=None, id=None):
+        record = UserRecord(**row._asdict()) if row is not None else None
+        self.identity_cache.set(user_id, record)
+        return record
+
+    def insert_user(self, username, email, password) -> bool:
+        """
+        Single INSERT; the unique indexes do the duplicate check, so there is
+        no SELECT round trip and concurrent signups cannot both succeed.
+        Raises UserExistsError when the username or email is taken.
+        """
+        user_id = str(uuid.uuid4())
         try:
-            return (
-                db.session.query(Users)
-                .filter(
-                    or_(
-                        Users.username == username if username is not None else False,
-                        Users.email == email if email is not None else False,
-                        Users.id == id if id is not None else False,
-                    )
+            db.session.execute(
+                sa.insert(Users).values(
+                    id=user_id,
+                    username=username,
+                    email=email,
+                    password_hash=password,
                 )
-                .first()
             )
+            db.session.commit()
+            mark_write(user_id, f"username:{username}", f"email:{email}")
+            return user_id
+        except IntegrityError:
+            db.session.rollback()
+            # Only the failure path pays for these lookups. A taken username
+            # is reported first, whichever index the database tripped on.
+            if self.find_user_by_username(username, primary=True):
+                raise UserExistsError("username")
+            if self.find_user_by_email(email, primary=True):
+                raise UserExistsError("email")
+            return False
         except:
             db.session.rollback()
             return False
 
-    def insert_user(self, username, email, password) -> bool:
+    def delete_user(self, user, chunk_size=None) -> bool:
+        """
+        Deletes the user; the database cascades to their photos. With a
+        chunk size (USER_PURGE_CHUNK_SIZE by default, 0 = off) photos are
+        first removed in bounded batches, each in its own transaction, so a
+        huge account never holds one long lock or one giant WAL burst.
+        """
+        if chunk_size is None:
+            chunk_size = self.purge_chunk_size
         try:
-            new_user = Users(
-                id=str(uuid.uuid4()),
-                username=username,
-                email=email,
-                password_hash=password,
+            if chunk_size:
+                self._purge_photos(user.id, chunk_size)
+            blob_refs = dict(
+                db.session.execute(
+                    sa.select(Photos.content_hash, sa.func.count())
+                    .where(Photos.user_id == user.id, Photos.content_hash.is_not(None))
+                    .group_by(Photos.content_hash)
+                ).all()
             )
-            db.session.add(new_user)
+            db.session.execute(sa.delete(Users).where(Users.id == user.id))
+            # The cascade bypasses PhotosService, so drop the search entries
+            # and give back the blob references of the photos it removed.
+            self.search_index.remove_user(user.id)
+            self.blobs.release(blob_refs)
             db.session.commit()
-            return new_user.id
+            self.identity_cache.invalidate(user.id)
+            mark_write(user.id, f"username:{user.username}", f"email:{user.email}")
+            return True
         except:
             db.session.rollback()
             return False
 
-    def delete_user(self, user) -> bool:
+    def _purge_photos(self, user_id, chunk_size):
+        while True:
+            chunk = (
+                sa.select(Photos.id)
+                .where(Photos.user_id == user_id)
+                .limit(chunk_size)
+                .scalar_subquery()
+            )
+            deleted = db.session.execute(
+                sa.delete(Photos)
+                .where(Photos.id.in_(chunk))
+                .returning(Photos.id, Photos.content_hash)
+                .execution_options(synchronize_session=False)
+            ).all()
+            self.search_index.remove([row.id for row in deleted])
+            self.blobs.release(
+                collections.Counter(
+                    row.content_hash for row in deleted if row.content_hash
+                )
+            )
+            db.session.commit()
+            if len(deleted) < chunk_size:
+                return
+
+    def update_password_hash(self, user, password_hash) -> bool:
         try:
-            db.session.delete(user)
+            db.session.execute(
+                sa.update(Users)
+                .where(Users.id == user.id)
+                .values(password_hash=password_hash)
+            )
             db.session.commit()
+            mark_write(user.id, f"username:{user.username}")
             return True
         except:
             db.session.rollback()
@@ -58,9 +210,16 @@ class UsersService:
 
     def update_email(self, user, email) -> bool:
         try:
-            user.email = email
+            updated = db.session.execute(
+                sa.update(Users)
+                .where(Users.id == user.id)
+                .values(email=email)
+                .returning(Users.id)
+            ).first()
             db.session.commit()
-            return True
+            self.identity_cache.invalidate(user.id)
+            mark_write(user.id, f"email:{user.email}", f"email:{email}")
+            return updated is not None
         except:
             db.session.rollback()
             return False
@@ -0,0 +1,8 @@
+"""
+Throughput/latency benchmark of the auth and photo endpoints.
+
+    python -m benchmark --mode http --users 50 --photos 500 --concurrency 8
+    BENCHMARK_DATABASE_URL=postgresql://... python -m benchmark
+
+Results are written as JSON; pass --baseline to fail on regressions.
+"""
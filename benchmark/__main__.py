@@ -0,0 +1,78 @@
+import datetime
+import json
+import platform
+
+import click
+
+from app import create_app, db
+from benchmark.runner import InProcessClient, HttpClient, compare, run_benchmark, serve
+
+
+@click.command()
+@click.option(
+    "--mode",
+    type=click.Choice(["inprocess", "http"]),
+    default="inprocess",
+    show_default=True,
+    help="Flask test client, or real HTTP against a local server.",
+)
+@click.option("--users", default=20, show_default=True)
+@click.option("--photos", default=200, show_default=True)
+@click.option("--concurrency", default=8, show_default=True)
+@click.option("--output", default="bench_results.json", show_default=True)
+@click.option("--baseline", default=None, help="Results JSON to compare with.")
+@click.option(
+    "--tolerance",
+    default=0.2,
+    show_default=True,
+    help="Allowed p95/rps regression against the baseline, as a fraction.",
+)
+def main(mode, users, photos, concurrency, output, baseline, tolerance):
+    """Benchmark register, login, add and delete; see BenchmarkConfig."""
+    app = create_app("benchmark")
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            db.drop_all()
+        db.create_all()
+        database = db.engine.dialect.name
+
+    if mode == "http":
+        with serve(app) as base_url:
+            endpoints = run_benchmark(HttpClient(base_url), users, photos, concurrency)
+    else:
+        endpoints = run_benchmark(InProcessClient(app), users, photos, concurrency)
+
+    results = {
+        "meta": {
+            "mode": mode,
+            "database": database,
+            "users": users,
+            "photos": photos,
+            "concurrency": concurrency,
+            "python": platform.python_version(),
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        },
+        "endpoints": endpoints,
+    }
+    with open(output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+    for endpoint, stats in endpoints.items():
+        click.echo(
+            f"{endpoint:28} {stats['rps']:>9} req/s  p50 {stats['p50_ms']:>8} ms"
+            f"  p95 {stats['p95_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms"
+            f"  errors {stats['errors']}"
+        )
+    click.echo(f"Wrote {output}")
+
+    if baseline:
+        with open(baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), tolerance)
+        for regression in regressions:
+            click.echo(regression, err=True)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import json
+import logging
+import math
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from werkzeug.serving import make_server
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list, or None if empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Collects per-endpoint latencies (ms) and error counts from many threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+        self._elapsed = {}
+
+    def record(self, endpoint, latency_ms, ok):
+        with self._lock:
+            self._latencies.setdefault(endpoint, []).append(latency_ms)
+            self._errors.setdefault(endpoint, 0)
+            if not ok:
+                self._errors[endpoint] += 1
+
+    def set_elapsed(self, endpoint, seconds):
+        with self._lock:
+            self._elapsed[endpoint] = seconds
+
+    def summary(self):
+        with self._lock:
+            summary = {}
+            for endpoint, latencies in self._latencies.items():
+                latencies = sorted(latencies)
+                elapsed = self._elapsed.get(endpoint) or sum(latencies) / 1000
+                summary[endpoint] = {
+                    "requests": len(latencies),
+                    "errors": self._errors[endpoint],
+                    "rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+                    **{
+                        f"p{q}_ms": round(percentile(latencies, q), 3)
+                        for q in PERCENTILES
+                    },
+                }
+            return summary
+
+
+class InProcessClient:
+    """Drives the app through Flask's test client, one client per thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Drives a running server over real HTTP with urllib."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, headers=None):
+        data = None
+        headers = dict(headers or {})
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(
+            self.base_url + path, data=data, headers=headers, method=method
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as error:
+            status, payload = error.code, error.read()
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+
+@contextlib.contextmanager
+def serve(app, host="127.0.0.1", port=0):
+    """Runs app on a threaded werkzeug server; yields its base URL."""
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_port}"
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def run_benchmark(client, users, photos, concurrency):
+    """
+    Registers `users` users, logs each in, adds `photos` photos spread over
+    them and deletes them again. Each endpoint is driven in its own phase
+    with `concurrency` threads, so its requests/sec is measured under a
+    uniform load. Returns the Recorder summary.
+    """
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    accounts = [
+        {
+            "username": f"bench_{run_id}_{i}",
+            "email": f"bench_{run_id}_{i}@example.com",
+            "password": "benchmark password",
+        }
+        for i in range(users)
+    ]
+
+    def call(endpoint, method, path, body=None, headers=None):
+        started = time.perf_counter()
+        try:
+            status, payload = client.request(method, path, body, headers)
+        except Exception:
+            status, payload = None, None
+        recorder.record(endpoint, (time.perf_counter() - started) * 1000, status == 200)
+        return payload if status == 200 else None
+
+    def phase(endpoint, fn, items):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(fn, items))
+        recorder.set_elapsed(endpoint, time.perf_counter() - started)
+        return results
+
+    phase(
+        "POST /api/user/register",
+        lambda account: call(
+            "POST /api/user/register", "POST", "/api/user/register", account
+        ),
+        accounts,
+    )
+
+    def login(account):
+        payload = call(
+            "POST /api/user/login",
+            "POST",
+            "/api/user/login",
+            {"username": account["username"], "password": account["password"]},
+        )
+        return payload and {"Authorization": f"Bearer {payload['access_token']}"}
+
+    tokens = [
+        headers for headers in phase("POST /api/user/login", login, accounts) if headers
+    ]
+    if not tokens:
+        return recorder.summary()
+
+    def add(i):
+        headers = tokens[i % len(tokens)]
+        payload = call(
+            "POST /api/photos/add",
+            "POST",
+            "/api/photos/add",
+            {"photo_url": f"http://example.com/{run_id}/{i}.jpg"},
+            headers,
+        )
+        return payload and (headers, payload["photo_id"])
+
+    added = [item for item in phase("POST /api/photos/add", add, range(photos)) if item]
+
+    def delete(item):
+        headers, photo_id = item
+        call(
+            "DELETE /api/photos/delete",
+            "DELETE",
+            f"/api/photos/delete/{photo_id}",
+            headers=headers,
+        )
+
+    phase("DELETE /api/photos/delete", delete, added)
+    return recorder.summary()
+
+
+def compare(results, baseline, tolerance):
+    """
+    Lists regressions of results against a baseline run: an endpoint whose
+    p95 grew, or whose requests/sec dropped, by more than `tolerance` (a
+    fraction), or that failed requests the baseline did not.
+    """
+    regressions = []
+    for endpoint, base in baseline.get("endpoints", {}).items():
+        current = results["endpoints"].get(endpoint)
+        if current is None:
+            regressions.append(f"{endpoint}: missing from this run")
+            continue
+        if base.get("p95_ms") and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{endpoint}: p95 {current['p95_ms']} ms, baseline {base['p95_ms']} ms"
+            )
+        if base.get("rps") and current["rps"] < base["rps"] / (1 + tolerance):
+            regressions.append(
+                f"{endpoint}: {current['rps']} req/s, baseline {base['rps']} req/s"
+            )
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(
+                f"{endpoint}: {current['errors']} errors, baseline {base.get('errors', 0)}"
+            )
+    return regressions
@@ -1,13 +1,140 @@
+import datetime
 import os
+import tempfile
+
+
+def engine_options(uri):
+    """SQLAlchemy engine/pool settings for server databases, from env."""
+    if not uri or uri.startswith("sqlite"):
+        return {}
+    options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    }
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+    if statement_timeout and uri.startswith("postgresql"):
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={statement_timeout}"
+        }
+    return options
+
+
+def replica_binds(urls):
+    """SQLALCHEMY_BINDS entries replica_0, replica_1, ... for comma-separated URLs."""
+    return {
+        f"replica_{i}": {"url": url, **engine_options(url)}
+        for i, url in enumerate(url for url in (urls or "").split(",") if url)
+    }
 
 
 class Config:
     SECRET_KEY = os.urandom(64)
     SQLALCHEMY_DATABASE_URI = os.getenv("URL")
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(os.getenv("URL"))
+    # Read replicas for lookups (get_photo_by_id, find_user_*). Reads stay on
+    # the primary for REPLICA_STICKY_SECONDS after the same client writes (a
+    # REPLICA_PIN_COOKIE cookie carries this across workers); misses and a
+    # failing replica, skipped for REPLICA_RETRY_SECONDS, fall back to it.
+    SQLALCHEMY_BINDS = replica_binds(os.getenv("DB_REPLICA_URLS"))
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 5.0))
+    REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", 30.0))
+    REPLICA_PIN_COOKIE = os.getenv("REPLICA_PIN_COOKIE", "primary_until")
     JWT_SECRET_KEY = os.urandom(64)
+    JWT_ACCESS_TOKEN_EXPIRES = datetime.timedelta(minutes=60)
+    # Exchanged at /api/user/refresh for a new pair; rotated on every use.
+    JWT_REFRESH_TOKEN_EXPIRES = datetime.timedelta(
+        days=int(os.getenv("JWT_REFRESH_TOKEN_DAYS", 30))
+    )
+    # Revoked tokens are checked in memory; a background thread per worker
+    # picks up other processes' logouts from revoked_tokens this often.
+    REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", 1.0))
+    REVOCATION_REFRESH_LAG = float(os.getenv("REVOCATION_REFRESH_LAG", 5.0))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     TESTING = False
     DEBUG = True
+    # /internal/* pool and hashing stats; keep off on public deployments.
+    INTERNAL_ENDPOINTS_ENABLED = os.getenv("INTERNAL_ENDPOINTS_ENABLED", "1") == "1"
+    # /apispec_1.json; the UI at /apidocs/ loads flasgger at startup. Without
+    # the UI the spec is read from SWAGGER_SPEC_FILE (`flask apidocs build`)
+    # or built on first request.
+    SWAGGER_ENABLED = os.getenv("SWAGGER_ENABLED", "1") == "1"
+    SWAGGER_UI = os.getenv("SWAGGER_UI", "1") == "1"
+    SWAGGER_SPEC_FILE = os.getenv("SWAGGER_SPEC_FILE")
+    # Per-route latency/SQL histograms at /metrics (Prometheus text format)
+    # and a Server-Timing header; off by default in production. Restrict
+    # /metrics to scrapers at the proxy.
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "1") == "1"
+    # Development/staging diagnostics: slow-query log with EXPLAIN plans,
+    # repeated-statement (N+1) warnings and per-route query budgets, set per
+    # view with @query_budget or QUERY_BUDGET_DEFAULT (0 = no budget).
+    DIAGNOSTICS_ENABLED = os.getenv("DIAGNOSTICS_ENABLED", "0") == "1"
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+    QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", 5))
+    QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", 0))
+    QUERY_BUDGET_ACTION = os.getenv("QUERY_BUDGET_ACTION", "warn")
+    # Checked by `flask startup-report`.
+    STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 1500))
+    PHOTOS_BATCH_MAX_ITEMS = int(os.getenv("PHOTOS_BATCH_MAX_ITEMS", 1000))
+    # Group commit for single photo inserts: concurrent inserts wait up to
+    # this many ms (or for MAX_BATCH rows) and share one transaction, i.e.
+    # one WAL flush. 0 commits every insert on its own.
+    PHOTO_GROUP_COMMIT_WINDOW_MS = float(os.getenv("PHOTO_GROUP_COMMIT_WINDOW_MS", 0))
+    PHOTO_GROUP_COMMIT_MAX_BATCH = int(os.getenv("PHOTO_GROUP_COMMIT_MAX_BATCH", 64))
+    # Per-process photo lookup cache; 0 disables it.
+    PHOTO_CACHE_SIZE = int(os.getenv("PHOTO_CACHE_SIZE", 1024))
+    PHOTO_CACHE_TTL = float(os.getenv("PHOTO_CACHE_TTL", 60))
+    # Per-process JWT identity -> user cache; 0 disables it.
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+    # Delete a user's photos in batches of this size before the user row;
+    # 0 leaves everything to the single ON DELETE CASCADE statement.
+    USER_PURGE_CHUNK_SIZE = int(os.getenv("USER_PURGE_CHUNK_SIZE", 0))
+    # Uploaded photo bytes, stored once per SHA-256.
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    STORAGE_ROOT = os.getenv("STORAGE_ROOT", "storage")
+    STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", 64 * 1024))
+    # "x-accel-redirect" (nginx) or "x-sendfile" lets the front proxy send
+    # photo bytes; with x-accel-redirect, STORAGE_ACCEL_PREFIX is the
+    # internal location that maps to STORAGE_ROOT.
+    STORAGE_OFFLOAD = os.getenv("STORAGE_OFFLOAD", "")
+    STORAGE_ACCEL_PREFIX = os.getenv("STORAGE_ACCEL_PREFIX", "/protected-photos/")
+    PHOTO_MAX_UPLOAD_BYTES = int(os.getenv("PHOTO_MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+    # Argon2 runs on a bounded pool in each process, so up to WEB_WORKERS x
+    # HASHING_POOL_WORKERS hashes run at once, each on ARGON2_PARALLELISM
+    # threads. Unset, the pool gets cores // (WEB_WORKERS x parallelism)
+    # workers (at least 1) so login bursts leave CPU for the photo
+    # endpoints. gunicorn.conf.py exports its WEB_WORKERS.
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", 1))
+    HASHING_POOL_WORKERS = int(os.getenv("HASHING_POOL_WORKERS", 0)) or None
+    HASHING_POOL_QUEUE_SIZE = int(os.getenv("HASHING_POOL_QUEUE_SIZE", 64))
+    HASHING_TIMEOUT = float(os.getenv("HASHING_TIMEOUT", 5.0))
+    # Argon2 cost: a named profile from app.service.hashing.HASHER_PROFILES,
+    # whose parameters any ARGON2_* value set here overrides. Run `flask
+    # hashing calibrate` once and pin its output here, the same on every
+    # host. Existing hashes are upgraded to the current cost on the user's
+    # next login.
+    PASSWORD_HASHER_PROFILE = os.getenv("PASSWORD_HASHER_PROFILE", "default")
+    ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 0)) or None
+    ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 0)) or None
+    ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 0)) or None
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+    TESTING = False
+    # Required: every worker, container and restart must sign and verify
+    # with the same keys. create_app refuses to start without them.
+    SECRET_KEY = os.getenv("SECRET_KEY")
+    JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+    INTERNAL_ENDPOINTS_ENABLED = os.getenv("INTERNAL_ENDPOINTS_ENABLED", "0") == "1"
+    # /metrics has no authentication; opt in where only scrapers reach it.
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+    SWAGGER_ENABLED = os.getenv("SWAGGER_ENABLED", "0") == "1"
+    SWAGGER_UI = os.getenv("SWAGGER_UI", "0") == "1"
 
 
 class TestingConfig(Config):
@@ -15,6 +142,36 @@ class TestingConfig(Config):
     SECRET_KEY = os.urandom(64)
     JWT_SECRET_KEY = os.urandom(64)
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    INTERNAL_ENDPOINTS_ENABLED = True
+    SWAGGER_UI = False
+    STORAGE_ROOT = os.path.join(tempfile.gettempdir(), "photo_project_test_storage")
+    PHOTO_MAX_UPLOAD_BYTES = 1024 * 1024
+    PASSWORD_HASHER_PROFILE = "fast"
+    # No poller thread: it would share the single in-memory connection with
+    # the tests, which call refresh() themselves.
+    REVOCATION_REFRESH_SECONDS = 0
+    DIAGNOSTICS_ENABLED = True
+    QUERY_BUDGET_DEFAULT = 20
+    QUERY_BUDGET_ACTION = "raise"
+    ARGON2_TIME_COST = None
+    ARGON2_MEMORY_COST = None
+    ARGON2_PARALLELISM = None
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     DEBUG = True
     WTF_CSRF_ENABLED = False
+
+
+class BenchmarkConfig(Config):
+    """Used by `python -m benchmark`; production-like, real argon2 cost."""
+
+    DEBUG = False
+    TESTING = False
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        "BENCHMARK_DATABASE_URL",
+        "sqlite:///" + os.path.join(tempfile.gettempdir(), "photo_project_bench.db"),
+    )
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(os.getenv("BENCHMARK_DATABASE_URL"))
+    SWAGGER_UI = False
+    STORAGE_ROOT = os.path.join(tempfile.gettempdir(), "photo_project_bench_storage")
@@ -0,0 +1,45 @@
+import os
+import multiprocessing
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# Pre-fork model: each worker is a separate process with its own threads.
+# `kill -HUP <master pid>` replaces the workers gracefully, but with
+# preload_app (the default below) they fork from the master's already
+# imported app: new code and .env values need a full restart, or
+# WEB_PRELOAD=0.
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# The app sizes its per-process pools (argon2 hashing) by the worker count.
+os.environ["WEB_WORKERS"] = str(workers)
+threads = int(os.getenv("WEB_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.getenv("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+
+# Recycle workers periodically to cap slow memory growth; jitter keeps them
+# from restarting all at once.
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 1000))
+
+# Load the app once in the master so workers fork with it already imported.
+preload_app = os.getenv("WEB_PRELOAD", "1") == "1"
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the forked
+    # worker; drop the pool without closing the parent's sockets.
+    from wsgi import app
+    from app import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    # Threads do not survive fork: each worker polls revocations itself.
+    from app.routes.user import auth_Blueprint
+
+    auth_Blueprint.revocations.start(app)
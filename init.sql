@@ -1,3 +1,6 @@
+-- Runs only when the Postgres volume is created. Existing databases are
+-- brought up to this schema with upgrade.sql.
+
 CREATE TABLE IF NOT EXISTS users
 (
     id varchar(64) PRIMARY KEY,
@@ -9,14 +12,54 @@ CREATE TABLE IF NOT EXISTS users
 CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email);
 CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username);
 
+CREATE TABLE IF NOT EXISTS blobs
+(
+    sha256 varchar(64) PRIMARY KEY,
+    size bigint NOT NULL,
+    content_type varchar(127) NOT NULL,
+    refcount integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS revoked_tokens
+(
+    id serial PRIMARY KEY,
+    user_id varchar(64) NOT NULL,
+    jti varchar(64),
+    issued_before bigint,
+    expires_at bigint NOT NULL,
+    revoked_at bigint NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_expires_at ON revoked_tokens (expires_at);
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_revoked_at ON revoked_tokens (revoked_at);
+
+CREATE TABLE IF NOT EXISTS refresh_tokens
+(
+    jti varchar(64) PRIMARY KEY,
+    user_id varchar(64) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    family varchar(64) NOT NULL,
+    expires_at bigint NOT NULL,
+    used_at bigint
+);
+
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens (user_id);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family ON refresh_tokens (family);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_expires_at ON refresh_tokens (expires_at);
+
 CREATE TABLE IF NOT EXISTS photos (
     id varchar(64) PRIMARY KEY, 
     user_id varchar(64) NOT NULL,
-    photo_url varchar(120 NOT NULL,
+    photo_url varchar(255) NOT NULL,
     description TEXT,
+    created_at timestamp NOT NULL DEFAULT now(),
+    content_hash varchar(64) REFERENCES blobs(sha256),
+    search_vector tsvector GENERATED ALWAYS AS
+        (to_tsvector('simple', coalesce(description, ''))) STORED,
 
     FOREIGN KEY (user_id) REFERENCES users(id) 
         ON DELETE CASCADE 
         ON UPDATE CASCADE
 );
-CREATE INDEX idx_user_id ON photos (user_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_user_id ON photos (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_photos_content_hash ON photos (content_hash);
+CREATE INDEX IF NOT EXISTS ix_photos_search_vector ON photos USING GIN (search_vector);
\ No newline at end of file
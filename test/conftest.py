@@ -0,0 +1,112 @@
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from app import create_app, db
+from app.routes.user import auth_Blueprint
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Одно приложение и одна схема на весь прогон тестов."""
+    flask_app = create_app("test")
+
+    with flask_app.app_context():
+        # pysqlite opens and commits transactions on its own, which breaks
+        # SAVEPOINT; let SQLAlchemy emit BEGIN itself instead.
+        @sa.event.listens_for(db.engine, "connect")
+        def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @sa.event.listens_for(db.engine, "begin")
+        def _begin(connection):
+            connection.exec_driver_sql("BEGIN")
+
+        db.create_all()
+        # Load the revocation mirror now rather than in whichever request
+        # happens to come first, where it would count against query budgets.
+        auth_Blueprint.revocations.refresh()
+        db.session.remove()
+        yield flask_app
+        db.drop_all()
+
+
+@pytest.fixture(scope="session")
+def test_client(app):
+    with app.test_client() as testing_client:
+        yield testing_client
+
+
+@pytest.fixture(scope="session")
+def new_user():
+    """Создание фикстуры для нового пользователя."""
+    return {
+        "username": "test_user",
+        "email": "test_user@example.com",
+        "password": "password123",
+    }
+
+
+@pytest.fixture
+def bearer():
+    """Заголовок авторизации для access- или refresh-токена."""
+    return lambda token: {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def login(test_client, bearer):
+    """
+    Фабрика входа: login(user) возвращает ответ /api/user/login с токенами и
+    заголовком авторизации access-токена в "headers". С register=True
+    пользователь сначала регистрируется.
+    """
+
+    def login(user, register=False):
+        if register:
+            test_client.post("/api/user/register", json=user)
+        tokens = test_client.post(
+            "/api/user/login",
+            json={"username": user["username"], "password": user["password"]},
+        ).json
+        return {**tokens, "headers": bearer(tokens["access_token"])}
+
+    return login
+
+
+@pytest.fixture
+def registered_user(test_client, new_user):
+    """Создание фикстуры для зарегистрированного пользователя."""
+    test_client.post("/api/user/register", json=new_user)
+    return new_user
+
+
+@pytest.fixture
+def auth_headers(login, registered_user):
+    """Создание фикстуры для получения токена авторизации."""
+    return login(registered_user)["headers"]
+
+
+@pytest.fixture(autouse=True)
+def db_transaction(app):
+    """
+    Каждый тест выполняется внутри транзакции, которая откатывается после
+    него. Коммиты сервисов освобождают лишь SAVEPOINT, так что тесты не
+    видят данных друг друга и схему не нужно пересоздавать.
+    """
+    connection = db.engine.connect()
+    transaction = connection.begin()
+    session = so.scoped_session(
+        so.sessionmaker(
+            bind=connection,
+            join_transaction_mode="create_savepoint",
+            query_cls=db.Query,
+        ),
+        scopefunc=db.session.registry.scopefunc,
+    )
+    original_session, db.session = db.session, session
+    try:
+        yield session
+    finally:
+        session.remove()
+        db.session = original_session
+        transaction.rollback()
+        connection.close()
@@ -0,0 +1,37 @@
+from benchmark.runner import InProcessClient, compare, percentile, run_benchmark
+
+
+def test_percentile():
+    """Тестирование вычисления перцентилей по рангу."""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 95) == 7
+    assert percentile([], 50) is None
+
+
+def test_run_benchmark_in_process(test_client):
+    """Тестирование прогона бенчмарка через тестовый клиент."""
+    endpoints = run_benchmark(
+        InProcessClient(test_client.application), users=2, photos=4, concurrency=1
+    )
+
+    assert endpoints["POST /api/user/register"]["requests"] == 2
+    assert endpoints["POST /api/photos/add"]["requests"] == 4
+    assert endpoints["DELETE /api/photos/delete"]["requests"] == 4
+    for stats in endpoints.values():
+        assert stats["errors"] == 0
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+def test_compare_with_baseline():
+    """Тестирование поиска регрессий относительно базового прогона."""
+    baseline = {"endpoints": {"GET /": {"rps": 100, "p95_ms": 10, "errors": 0}}}
+    same = {"endpoints": {"GET /": {"rps": 95, "p95_ms": 11, "errors": 0}}}
+    slower = {"endpoints": {"GET /": {"rps": 50, "p95_ms": 30, "errors": 1}}}
+
+    assert compare(same, baseline, tolerance=0.2) == []
+    assert len(compare(slower, baseline, tolerance=0.2)) == 3
+    assert compare({"endpoints": {}}, baseline, tolerance=0.2) == [
+        "GET /: missing from this run"
+    ]
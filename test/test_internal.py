@@ -0,0 +1,180 @@
+import logging
+import pytest
+import sqlalchemy as sa
+import subprocess
+import sys
+import time
+from app import db
+from app.models.photos import Photos
+from app.monitoring.diagnostics import explain
+from app.monitoring.pool import InstrumentedQueuePool, instrument_pool, pool_status
+from app.service.replicas import ReplicaRouter
+
+
+def test_pool_stats(test_client):
+    """Тестирование эндпоинта статистики пула соединений."""
+    response = test_client.get("/internal/pool")
+    assert response.status_code == 200
+    assert "pool_class" in response.json["default"]
+
+
+def test_pool_stats_report_replica_health(test_client, monkeypatch):
+    """Тестирование состояния реплик в статистике пула соединений."""
+    router = ReplicaRouter({"SQLALCHEMY_BINDS": {"replica_0": {}}})
+    router._down_until["replica_0"] = time.monotonic() + 60
+    monkeypatch.setitem(db.engines, "replica_0", sa.create_engine("sqlite://"))
+    monkeypatch.setitem(test_client.application.extensions, "replicas", router)
+
+    response = test_client.get("/internal/pool")
+    assert response.json["replica_0"]["healthy"] is False
+    assert "pool_class" in response.json["replica_0"]
+    assert "healthy" not in response.json["default"]
+
+
+def test_hashing_stats(test_client):
+    """Тестирование эндпоинта статистики пула хеширования."""
+    response = test_client.get("/internal/hashing")
+    assert response.status_code == 200
+    assert response.json["in_flight"] == 0
+
+
+def test_instrumented_pool_counts_timeouts():
+    """Тестирование учёта ожиданий и таймаутов пула соединений."""
+    engine = sa.create_engine(
+        "sqlite://",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    connection = engine.connect()
+    with pytest.raises(sa.exc.TimeoutError):
+        engine.connect()
+
+    status = pool_status(engine)
+    assert status["checked_out"] == 1
+    assert status["checkouts"] == 1
+    assert status["timeouts"] == 1
+    assert status["wait_max_ms"] >= 50
+
+    connection.close()
+    engine.dispose()
+    assert pool_status(engine)["checkouts"] == 1
+
+
+def test_instrument_pool_options():
+    """Тестирование инструментирования пулов основной базы и реплик."""
+    replica = {"url": "postgresql://replica/db", "pool_size": 5}
+    assert instrument_pool(replica)["poolclass"] is InstrumentedQueuePool
+    assert "poolclass" not in replica
+    assert instrument_pool({"url": "sqlite:///replica.db"}) == {
+        "url": "sqlite:///replica.db"
+    }
+    assert instrument_pool({}) == {}
+
+
+def test_apispec_built_lazily(test_client):
+    """Тестирование ленивой сборки OpenAPI-спецификации при первом запросе."""
+    assert "apispec" not in test_client.application.extensions
+
+    response = test_client.get("/apispec_1.json")
+    assert response.status_code == 200
+    assert "/api/photos/search" in response.json["paths"]
+    assert "apispec" in test_client.application.extensions
+    assert test_client.get("/apidocs/").status_code == 404
+
+
+def test_server_timing_and_metrics(test_client):
+    """Тестирование заголовка Server-Timing и эндпоинта /metrics."""
+    user = {
+        "username": "metrics_user",
+        "email": "metrics_user@example.com",
+        "password": "password123",
+    }
+    test_client.post("/api/user/register", json=user)
+    response = test_client.post(
+        "/api/user/login",
+        json={"username": user["username"], "password": user["password"]},
+    )
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("app;dur=")
+    assert "db;dur=" in timing and "queries" in timing
+    assert "argon2;dur=" in timing
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.data.decode()
+    assert (
+        'http_requests_total{method="POST",route="/api/user/login",status="200"}'
+        in body
+    )
+    assert (
+        'http_request_duration_seconds_count{method="POST",route="/api/user/login"}'
+        in body
+    )
+    assert (
+        'http_request_db_statements_bucket{method="POST",route="/api/user/login",le="+Inf"}'
+        in body
+    )
+    assert 'http_request_span_duration_seconds_count{span="argon2"}' in body
+
+
+def test_repeated_statements_logged(test_client, caplog):
+    """Тестирование обнаружения повторяющихся однотипных запросов (N+1)."""
+    app = test_client.application
+    with app.test_request_context("/metrics"):
+        app.preprocess_request()
+        for i in range(app.config["QUERY_REPEAT_THRESHOLD"]):
+            db.session.execute(sa.select(Photos).where(Photos.id == str(i))).all()
+        with caplog.at_level(logging.WARNING, logger="app.monitoring.diagnostics"):
+            app.process_response(app.response_class())
+
+    assert "Possible N+1 in GET /metrics" in caplog.text
+
+
+def test_explain_plan(test_client):
+    """Тестирование получения плана запроса для журнала медленных запросов."""
+    connection = db.session.connection()
+    plan = explain(connection, "SELECT id FROM photos WHERE user_id = ?", ("someone",))
+    assert "idx_user_id" in plan
+    assert explain(connection, "PRAGMA foreign_keys", ()) is None
+
+
+def test_failed_explain_keeps_transaction(test_client):
+    """Тестирование отката неудачного EXPLAIN до точки сохранения."""
+    connection = db.session.connection()
+    statements = []
+
+    @sa.event.listens_for(connection, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    plan = explain(connection, "SELECT missing FROM nowhere", ())
+    sa.event.remove(connection, "before_cursor_execute", record)
+
+    assert plan.startswith("<EXPLAIN failed")
+    assert statements[0].startswith("SAVEPOINT")
+    assert statements[-1].startswith("ROLLBACK TO SAVEPOINT")
+    assert db.session.execute(sa.select(sa.func.count(Photos.id))).scalar() == 0
+
+
+def test_startup_report_shows_probe_error(app, monkeypatch):
+    """Тестирование вывода ошибки запуска приложения в startup-report."""
+    monkeypatch.delenv("SECRET_KEY", raising=False)
+    monkeypatch.delenv("JWT_SECRET_KEY", raising=False)
+    result = app.test_cli_runner().invoke(
+        args=["startup-report", "--config", "production"]
+    )
+    assert result.exit_code == 1
+    assert "must be set in production" in result.output
+    assert "create_app('production') failed" in result.output
+
+
+def test_create_app_does_not_import_cli():
+    """Тестирование: команды CLI загружаются только командой flask."""
+    probe = "import sys\nfrom app import create_app\ncreate_app('test')\nprint('app.cli' in sys.modules)"
+    completed = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+    )
+    assert completed.stdout.strip() == "False"
@@ -1,36 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import io
+import json
+import os
 import pytest
-from app import create_app, db
+import time
+import uuid
+from app import db
+from app.models.blobs import Blobs
+from app.monitoring.diagnostics import QueryBudgetExceeded
+from app.routes.photos import photos_Blueprint
+from app.routes.user import auth_Blueprint
+from app.service.group_commit import GroupCommitter
+from app.service.photo_service import (
+    LIST_CURSOR,
+    SEARCH_CURSOR,
+    decode_cursor,
+    encode_cursor,
+)
+from app.service.storage import LocalStorage
 
 
-@pytest.fixture(scope="module")
-def new_user():
-    """Создание фикстуры для нового пользователя."""
-    return {
-        "username": "test_user",
-        "email": "test_user@example.com",
+@pytest.fixture
+def other_headers(login):
+    """Создание фикстуры для токена второго пользователя."""
+    other_user = {
+        "username": "other_user",
+        "email": "other_user@example.com",
         "password": "password123",
     }
-
-
-@pytest.fixture(scope="module")
-def test_client():
-    flask_app = create_app("test")
-
-    with flask_app.test_client() as testing_client:
-        with flask_app.app_context():
-            db.create_all()
-            yield testing_client
-            db.drop_all()
-
-
-@pytest.fixture(scope="module")
-def auth_headers(test_client, new_user):
-    """Создание фикстуры для получения токена авторизации."""
-    login_data = {"username": new_user["username"], "password": new_user["password"]}
-    test_client.post("/api/user/register", json=new_user)
-    response = test_client.post("/api/user/login", json=login_data)
-    access_token = response.json["access_token"]
-    return {"Authorization": f"Bearer {access_token}"}
+    return login(other_user, register=True)["headers"]
 
 
 """Тестирование эндпоинта photos."""
@@ -92,6 +91,50 @@ def test_delete_nonexistent_photo(test_client, auth_headers):
     assert response.json == {"msg": "Photo not found"}
 
 
+def test_photo_lookup_cache(test_client, auth_headers):
+    """Тестирование кеширования поиска фотографии, включая отсутствующие."""
+    photos = photos_Blueprint.photos
+    add_response = test_client.post(
+        "/api/photos/add",
+        json={"photo_url": "http://example.com/cached.jpg"},
+        headers=auth_headers,
+    )
+    photo_id = add_response.json["photo_id"]
+
+    stats = photos.cache.stats()
+    assert photos.get_photo_by_id(photo_id).photo_url == "http://example.com/cached.jpg"
+    assert photos.get_photo_by_id(photo_id).id == photo_id
+    assert photos.get_photo_by_id("cached_missing_id") is None
+    assert photos.get_photo_by_id("cached_missing_id") is None
+    new_stats = photos.cache.stats()
+    assert new_stats["misses"] == stats["misses"] + 2
+    assert new_stats["hits"] == stats["hits"] + 2
+
+    test_client.delete(f"/api/photos/delete/{photo_id}", headers=auth_headers)
+    assert photos.get_photo_by_id(photo_id) is None
+
+
+def test_delete_photo_of_another_user(test_client, auth_headers, other_headers):
+    """Тестирование удаления чужой фотографии."""
+    add_response = test_client.post(
+        "/api/photos/add",
+        json={"photo_url": "http://example.com/owned.jpg"},
+        headers=auth_headers,
+    )
+    photo_id = add_response.json["photo_id"]
+
+    response = test_client.delete(
+        f"/api/photos/delete/{photo_id}", headers=other_headers
+    )
+    assert response.status_code == 404
+    assert response.json == {"msg": "Photo not found"}
+
+    response = test_client.delete(
+        f"/api/photos/delete/{photo_id}", headers=auth_headers
+    )
+    assert response.status_code == 200
+
+
 def test_add_photo_without_token(test_client):
     """Тестирование добавления фотографии без токена."""
     photo_data = {
@@ -110,3 +153,441 @@ def test_delete_photo_without_token(test_client):
 
     assert response.status_code == 401
     assert response.json == {"msg": "Missing Authorization Header"}
+
+
+def test_list_photos_pagination(test_client, auth_headers):
+    """Тестирование постраничного получения фотографий пользователя."""
+    added_ids = set()
+    for i in range(5):
+        response = test_client.post(
+            "/api/photos/add",
+            json={"photo_url": f"http://example.com/page_{i}.jpg"},
+            headers=auth_headers,
+        )
+        added_ids.add(response.json["photo_id"])
+
+    seen_ids = []
+    cursor = None
+    while True:
+        query = {"limit": 2}
+        if cursor:
+            query["cursor"] = cursor
+        response = test_client.get(
+            "/api/photos/", query_string=query, headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert len(response.json["photos"]) <= 2
+        seen_ids.extend(photo["id"] for photo in response.json["photos"])
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen_ids) == len(set(seen_ids))
+    assert added_ids <= set(seen_ids)
+
+
+def test_list_photos_conditional(test_client, auth_headers):
+    """Тестирование ответа 304 на неизменившийся список фотографий."""
+    test_client.post(
+        "/api/photos/add/batch",
+        json={
+            "photos": [{"photo_url": f"http://example.com/c{i}.jpg"} for i in range(2)]
+        },
+        headers=auth_headers,
+    )
+    response = test_client.get("/api/photos/", headers=auth_headers)
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = test_client.get(
+        "/api/photos/", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    response = test_client.get(
+        "/api/photos/",
+        query_string={"limit": 1},
+        headers={**auth_headers, "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+
+    test_client.post(
+        "/api/photos/add",
+        json={"photo_url": "http://example.com/new.jpg"},
+        headers=auth_headers,
+    )
+    response = test_client.get(
+        "/api/photos/", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_list_photos_invalid_cursor(test_client, auth_headers):
+    """Тестирование получения фотографий с некорректным курсором."""
+    response = test_client.get(
+        "/api/photos/", query_string={"cursor": "garbage"}, headers=auth_headers
+    )
+
+    assert response.status_code == 400
+    assert response.json == {"msg": "Invalid cursor"}
+
+
+def test_cursor_codec():
+    """Тестирование кодирования курсоров списка и поиска."""
+    created_at = datetime.datetime(2024, 5, 1, 12, 30)
+    cursor = encode_cursor(created_at, "photo-id")
+    assert decode_cursor(cursor, LIST_CURSOR) == (created_at, "photo-id")
+    assert decode_cursor(encode_cursor(0.5, "id"), SEARCH_CURSOR) == (0.5, "id")
+
+    # Курсор поиска не подходит для списка и наоборот.
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(0.5, "id"), LIST_CURSOR)
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor("id"), SEARCH_CURSOR)
+
+
+def test_add_photos_batch(test_client, auth_headers):
+    """Тестирование пакетного добавления фотографий."""
+    batch = {
+        "photos": [
+            {"photo_url": "http://example.com/batch_1.jpg", "description": "One"},
+            {"description": "Without url"},
+            {"photo_url": "http://example.com/batch_2.jpg"},
+            {"photo_url": 123},
+            {"photo_url": "http://example.com/" + "x" * 300},
+        ]
+    }
+    response = test_client.post(
+        "/api/photos/add/batch", json=batch, headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    results = response.json["results"]
+    assert len(results) == 5
+    assert "photo_id" in results[0]
+    assert results[1] == {"error": "Missing data"}
+    assert "photo_id" in results[2]
+    assert results[3] == {"error": "Incorrect data type detected"}
+    assert results[4] == {"error": "Photo URL too long"}
+
+    delete_response = test_client.delete(
+        f"/api/photos/delete/{results[2]['photo_id']}", headers=auth_headers
+    )
+    assert delete_response.status_code == 200
+
+
+def test_add_photos_batch_too_many_items(test_client, auth_headers):
+    """Тестирование пакетного добавления сверх лимита."""
+    limit = test_client.application.config["PHOTOS_BATCH_MAX_ITEMS"]
+    batch = {"photos": [{"photo_url": "http://example.com/x.jpg"}] * (limit + 1)}
+    response = test_client.post(
+        "/api/photos/add/batch", json=batch, headers=auth_headers
+    )
+
+    assert response.status_code == 400
+    assert response.json == {"msg": "Too many items"}
+
+
+def test_export_photos(test_client, auth_headers):
+    """Тестирование потоковой выгрузки фотографий в NDJSON."""
+    test_client.post(
+        "/api/photos/add/batch",
+        json={
+            "photos": [{"photo_url": f"http://example.com/e{i}.jpg"} for i in range(3)]
+        },
+        headers=auth_headers,
+    )
+    listed = test_client.get(
+        "/api/photos/", query_string={"limit": 100}, headers=auth_headers
+    ).json["photos"]
+
+    response = test_client.get("/api/photos/export", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    exported = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(exported) == 3
+    assert sorted(photo["id"] for photo in exported) == sorted(
+        photo["id"] for photo in listed
+    )
+
+
+def upload(test_client, auth_headers, data, content_type="image/png"):
+    return test_client.post(
+        "/api/photos/upload",
+        data=data,
+        headers={**auth_headers, "Content-Type": content_type},
+    )
+
+
+def test_upload_photo_deduplicates_content(test_client, auth_headers):
+    """Тестирование загрузки одинаковых файлов: хранится одна копия."""
+    data = b"\x89PNG fake image bytes for dedupe"
+    first = upload(test_client, auth_headers, data)
+    second = upload(test_client, auth_headers, data)
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    content_hash = first.json["content_hash"]
+    assert second.json["content_hash"] == content_hash
+    assert first.json["photo_id"] != second.json["photo_id"]
+    assert db.session.get(Blobs, content_hash).refcount == 2
+
+    response = test_client.get(first.json["photo_url"], headers=auth_headers)
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.mimetype == "image/png"
+
+    test_client.delete(
+        f"/api/photos/delete/{first.json['photo_id']}", headers=auth_headers
+    )
+    db.session.expire_all()
+    assert db.session.get(Blobs, content_hash).refcount == 1
+
+    test_client.delete(
+        f"/api/photos/delete/{second.json['photo_id']}", headers=auth_headers
+    )
+    db.session.expire_all()
+    assert db.session.get(Blobs, content_hash) is None
+
+    photos = photos_Blueprint.photos
+    assert photos.storage.exists(content_hash)
+    photos.blobs.collect_garbage(photos.storage, grace_seconds=-1)
+    assert not photos.storage.exists(content_hash)
+
+
+def test_local_storage_creates_root_on_first_write(tmp_path):
+    """Тестирование создания каталога хранилища только при первой записи."""
+    root = tmp_path / "blobs"
+    storage = LocalStorage(str(root))
+    assert not root.exists()
+
+    content_hash, size = storage.save(io.BytesIO(b"bytes"))
+    assert size == 5
+    assert storage.exists(content_hash)
+
+
+def test_garbage_collection_skips_blob_touched_by_upload(test_client, tmp_path):
+    """Тестирование: сборщик мусора не удаляет файл, обновлённый загрузкой."""
+
+    class UploadDuringScan(LocalStorage):
+        def iter_blobs(self):
+            for content_hash, mtime in super().iter_blobs():
+                yield content_hash, mtime
+                # Загрузка тех же байтов между обходом и удалением.
+                os.utime(self.local_path(content_hash))
+
+    storage = UploadDuringScan(str(tmp_path))
+    content_hash, _ = storage.save(io.BytesIO(b"bytes"))
+    old = time.time() - 3600
+    os.utime(storage.local_path(content_hash), (old, old))
+
+    blobs = photos_Blueprint.photos.blobs
+    assert blobs.collect_garbage(storage, grace_seconds=60) == 0
+    assert storage.exists(content_hash)
+
+
+def test_upload_photo_not_image(test_client, auth_headers):
+    """Тестирование загрузки файла, не являющегося изображением."""
+    response = upload(test_client, auth_headers, b"text", content_type="text/plain")
+
+    assert response.status_code == 415
+    assert response.json == {"msg": "Unsupported media type"}
+
+
+def test_upload_photo_too_large(test_client, auth_headers):
+    """Тестирование загрузки файла сверх допустимого размера."""
+    photos = photos_Blueprint.photos
+    data = b"x" * (photos.max_upload_size + 1)
+    response = upload(test_client, auth_headers, data)
+
+    assert response.status_code == 413
+    assert response.json == {"msg": "File too large"}
+
+
+def test_photo_content_conditional_and_ranges(test_client, auth_headers):
+    """Тестирование ETag, 304 и запросов Range при отдаче файла."""
+    data = bytes(range(256)) * 4
+    uploaded = upload(test_client, auth_headers, data).json
+    url = uploaded["photo_url"]
+
+    response = test_client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{uploaded["content_hash"]}"'
+    assert "private" in response.headers["Cache-Control"]
+
+    response = test_client.get(
+        url, headers={**auth_headers, "If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+    assert response.data == b""
+
+    response = test_client.get(url, headers={**auth_headers, "Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.data == data[10:20]
+    assert response.headers["Content-Range"] == f"bytes 10-19/{len(data)}"
+
+    response = test_client.get(url, headers={**auth_headers, "Range": "bytes=0-3,-4"})
+    assert response.status_code == 206
+    assert response.mimetype == "multipart/byteranges"
+    assert int(response.headers["Content-Length"]) == len(response.data)
+    assert f"Content-Range: bytes 0-3/{len(data)}".encode() in response.data
+    assert data[:4] in response.data
+    assert data[-4:] in response.data
+
+    response = test_client.get(
+        url, headers={**auth_headers, "Range": f"bytes={len(data)}-"}
+    )
+    assert response.status_code == 416
+
+
+def test_photo_content_accel_redirect(test_client, auth_headers):
+    """Тестирование передачи отдачи файла прокси через X-Accel-Redirect."""
+    uploaded = upload(test_client, auth_headers, b"\x89PNG offloaded").json
+    config = test_client.application.config
+    config["STORAGE_OFFLOAD"] = "x-accel-redirect"
+    try:
+        response = test_client.get(uploaded["photo_url"], headers=auth_headers)
+    finally:
+        config["STORAGE_OFFLOAD"] = ""
+
+    content_hash = uploaded["content_hash"]
+    assert response.status_code == 200
+    assert response.data == b""
+    assert response.headers["X-Accel-Redirect"] == (
+        f"/protected-photos/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+    )
+
+
+def test_photo_content_of_another_user(test_client, auth_headers, other_headers):
+    """Тестирование запрета на получение чужого файла."""
+    uploaded = upload(test_client, auth_headers, b"\x89PNG private").json
+
+    response = test_client.get(uploaded["photo_url"], headers=other_headers)
+    assert response.status_code == 404
+
+
+def test_search_photos(test_client, auth_headers):
+    """Тестирование полнотекстового поиска по описаниям фотографий."""
+    response = test_client.post(
+        "/api/photos/add/batch",
+        json={
+            "photos": [
+                {
+                    "photo_url": "http://example.com/s1.jpg",
+                    "description": "sunset beach",
+                },
+                {
+                    "photo_url": "http://example.com/s2.jpg",
+                    "description": "beach party",
+                },
+                {
+                    "photo_url": "http://example.com/s3.jpg",
+                    "description": "sunset hill",
+                },
+            ]
+        },
+        headers=auth_headers,
+    )
+    ids = [result["photo_id"] for result in response.json["results"]]
+
+    def search(query, **params):
+        return test_client.get(
+            "/api/photos/search",
+            query_string={"q": query, **params},
+            headers=auth_headers,
+        )
+
+    found = [photo["id"] for photo in search("beach").json["photos"]]
+    assert sorted(found) == sorted(ids[:2])
+    assert [photo["id"] for photo in search("sunset beach").json["photos"]] == [ids[0]]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = search("sunset", **params)
+        assert response.status_code == 200
+        seen.extend(photo["id"] for photo in response.json["photos"])
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted([ids[0], ids[2]])
+
+    test_client.delete(f"/api/photos/delete/{ids[0]}", headers=auth_headers)
+    assert [photo["id"] for photo in search("beach").json["photos"]] == [ids[1]]
+
+    response = search('beach" OR *')
+    assert response.status_code == 200
+    assert response.json["photos"] == []
+
+
+def test_search_photos_missing_query(test_client, auth_headers):
+    """Тестирование поиска без поискового запроса."""
+    response = test_client.get("/api/photos/search", headers=auth_headers)
+
+    assert response.status_code == 400
+    assert response.json == {"msg": "Missing data"}
+
+
+def test_list_photos_query_budget(test_client, auth_headers, monkeypatch):
+    """Тестирование превышения бюджета SQL-запросов на маршрут."""
+    view = test_client.application.view_functions["photos_Blueprint.list_photos"]
+    monkeypatch.setattr(view, "query_budget", 1)
+    with pytest.raises(QueryBudgetExceeded):
+        test_client.get("/api/photos/", headers=auth_headers)
+
+
+def test_group_committer_coalesces_concurrent_writes():
+    """Тестирование объединения параллельных вставок в одну транзакцию."""
+    flushed = []
+
+    def flush(items):
+        flushed.append(list(items))
+        return [f"id-{item}" for item in items]
+
+    committer = GroupCommitter(flush, window=5, max_batch=4)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(committer.submit, range(4)))
+
+    assert results == [f"id-{i}" for i in range(4)]
+    assert len(flushed) == 1
+    assert sorted(flushed[0]) == [0, 1, 2, 3]
+
+
+def test_group_commit_isolates_failing_row(test_client, auth_headers, new_user):
+    """Тестирование отката группы и повторной вставки строк по одной."""
+    photos = photos_Blueprint.photos
+    user = auth_Blueprint.users.find_user_by_username(new_user["username"])
+
+    def item(user_id):
+        row = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "photo_url": "http://example.com/grouped.jpg",
+            "description": "grouped",
+            "content_hash": None,
+        }
+        return row, None
+
+    good, bad = item(user.id), item("no_such_user")
+    assert photos._flush_group([good, bad]) == [good[0]["id"], False]
+    assert photos.get_photo_by_id(good[0]["id"]) is not None
+    assert photos.get_photo_by_id(bad[0]["id"]) is None
+
+
+def test_insert_photo_group_commit_mode(test_client, auth_headers, new_user):
+    """Тестирование вставки фотографии в режиме группового коммита."""
+    photos = photos_Blueprint.photos
+    user = auth_Blueprint.users.find_user_by_username(new_user["username"])
+    photos.group_commit = GroupCommitter(photos._flush_group, window=0, max_batch=8)
+    try:
+        photo_id = photos.insert_photo(user.id, "http://example.com/g.jpg", "g")
+    finally:
+        photos.group_commit = None
+
+    assert photo_id
+    assert photos.get_photo_by_id(photo_id).description == "g"
@@ -1,36 +1,23 @@
+import threading
 import pytest
+import sqlalchemy as sa
+from flask import g
+from argon2 import PasswordHasher
 from app import create_app, db
-
-
-@pytest.fixture(scope="module")
-def new_user():
-    """Создание фикстуры для нового пользователя."""
-    return {
-        "username": "test_user",
-        "email": "test_user@example.com",
-        "password": "password123",
-    }
-
-
-@pytest.fixture(scope="module")
-def test_client():
-    flask_app = create_app("test")
-
-    with flask_app.test_client() as testing_client:
-        with flask_app.app_context():
-            db.create_all()
-            yield testing_client
-            db.drop_all()
-
-
-@pytest.fixture(scope="module")
-def auth_headers(test_client, new_user):
-    """Создание фикстуры для получения токена авторизации."""
-    login_data = {"username": new_user["username"], "password": new_user["password"]}
-    response = test_client.post("/api/user/login", json=login_data)
-    access_token = response.json["access_token"]
-    return {"Authorization": f"Bearer {access_token}"}
-
+from config import ProductionConfig
+from app.models.users import Users
+from app.models.photos import Photos
+from app.models.blobs import Blobs
+from app.routes.user import auth_Blueprint
+from app.service.replicas import ReplicaRouter
+from app.service.revocation_service import RevocationService
+from app.service.hashing import (
+    HashingPool,
+    HashingUnavailable,
+    calibrate,
+    default_pool_workers,
+    make_hasher,
+)
 
 """Тестирование эндпоинта регистрации."""
 
@@ -42,12 +29,28 @@ def test_register(test_client, new_user):
     assert response.json["msg"] == "Registration successful"
 
 
-def test_register_existing_user(test_client, new_user):
+def test_register_existing_user(test_client, registered_user, new_user):
     """Тестирование регистрации существующего пользователя."""
     response = test_client.post("/api/user/register", json=new_user)
 
     assert response.status_code == 401
     assert "Auth register existing" in response.json["msg"]
+    assert response.json["msg"] == "Auth register existing login"
+
+
+def test_register_existing_email(test_client, registered_user, new_user):
+    """Тестирование регистрации с уже занятым email."""
+    response = test_client.post(
+        "/api/user/register",
+        json={
+            "username": "another_user",
+            "email": new_user["email"],
+            "password": "password",
+        },
+    )
+
+    assert response.status_code == 401
+    assert response.json["msg"] == "Auth register existing email"
 
 
 def test_register_missing_username(test_client):
@@ -90,7 +93,7 @@ def test_register_incorrect_username_type(test_client):
 """Тестирование эндпоинта логина."""
 
 
-def test_login(test_client, new_user):
+def test_login(test_client, registered_user, new_user):
     """Тестирование эндпоинта логина."""
     login_data = {"username": new_user["username"], "password": new_user["password"]}
     response = test_client.post("/api/user/login", json=login_data)
@@ -98,7 +101,33 @@ def test_login(test_client, new_user):
     assert response.json["msg"] == "Login success"
 
 
-def test_login_incorrect_password(test_client, new_user):
+def test_login_rehashes_outdated_hash(test_client):
+    """Тестирование обновления хеша пароля с устаревшими параметрами при логине."""
+    user_data = {
+        "username": "rehash_user",
+        "email": "rehash_user@example.com",
+        "password": "password123",
+    }
+    test_client.post("/api/user/register", json=user_data)
+    user = db.session.query(Users).filter(Users.username == "rehash_user").first()
+    weak_hash = PasswordHasher(time_cost=1, memory_cost=1024, parallelism=1).hash(
+        user_data["password"]
+    )
+    user.password_hash = weak_hash
+    db.session.commit()
+
+    response = test_client.post(
+        "/api/user/login",
+        json={"username": "rehash_user", "password": user_data["password"]},
+    )
+    assert response.status_code == 200
+
+    db.session.refresh(user)
+    assert user.password_hash != weak_hash
+    assert not auth_Blueprint.users.needs_rehash(user.password_hash)
+
+
+def test_login_incorrect_password(test_client, registered_user, new_user):
     """Тестирование логина с неправильным паролем."""
     login_data = {"username": new_user["username"], "password": "wrong_password"}
     response = test_client.post("/api/user/login", json=login_data)
@@ -140,6 +169,23 @@ def test_edit_email(test_client, auth_headers):
     assert response.json["msg"] == "Update successful"
 
 
+def test_identity_cache(test_client, auth_headers):
+    """Тестирование кеширования пользователя по JWT и его инвалидации."""
+
+    def edit(email):
+        test_client.put("/api/user/edit", json={"email": email}, headers=auth_headers)
+        return test_client.get("/internal/cache").json["users"]
+
+    stats = edit(123)
+    cached_stats = edit(123)
+    assert cached_stats["hits"] == stats["hits"] + 1
+    assert cached_stats["misses"] == stats["misses"]
+
+    edit("cached@example.com")
+    invalidated_stats = edit(123)
+    assert invalidated_stats["misses"] == cached_stats["misses"] + 1
+
+
 def test_edit_email_existing_email(test_client, auth_headers):
     """Тестирование изменения email на уже существующий email."""
     existing_user_data = {
@@ -179,8 +225,385 @@ def test_delete_user(test_client, auth_headers):
     assert response.json["msg"] == "Delete successful"
 
 
+def test_deleted_user_token_rejected(test_client, auth_headers):
+    """Тестирование запроса с токеном удалённого пользователя."""
+    test_client.delete("/api/user/delete", headers=auth_headers)
+    response = test_client.put(
+        "/api/user/edit", json={"email": "ghost@example.com"}, headers=auth_headers
+    )
+    assert response.status_code == 400
+    assert response.json["msg"] == "User not found"
+
+
+@pytest.fixture
+def user_with_photos(test_client, login):
+    """Фабрика пользователя с count фотографиями; возвращает строку users."""
+
+    def create(username, count):
+        user_data = {
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "password123",
+        }
+        test_client.post(
+            "/api/photos/add/batch",
+            json={
+                "photos": [
+                    {"photo_url": f"http://example.com/{i}.jpg"} for i in range(count)
+                ]
+            },
+            headers=login(user_data, register=True)["headers"],
+        )
+        return auth_Blueprint.users.find_user_by_username(username)
+
+    return create
+
+
+def count_photos(user_id):
+    return db.session.query(Photos).filter(Photos.user_id == user_id).count()
+
+
+def test_delete_user_cascades_photos(test_client, user_with_photos):
+    """Тестирование каскадного удаления фотографий вместе с пользователем."""
+    user = user_with_photos("cascade_user", 3)
+    assert count_photos(user.id) == 3
+
+    assert auth_Blueprint.users.delete_user(user)
+    assert count_photos(user.id) == 0
+
+
+def test_delete_user_releases_blobs(test_client, user_with_photos, login):
+    """Тестирование освобождения загруженных файлов при удалении пользователя."""
+    user = user_with_photos("blob_user", 0)
+    headers = {
+        **login({"username": "blob_user", "password": "password123"})["headers"],
+        "Content-Type": "image/png",
+    }
+    data = b"\x89PNG blob owned by a deleted user"
+    content_hash = test_client.post(
+        "/api/photos/upload", data=data, headers=headers
+    ).json["content_hash"]
+    test_client.post("/api/photos/upload", data=data, headers=headers)
+    assert db.session.get(Blobs, content_hash).refcount == 2
+
+    assert auth_Blueprint.users.delete_user(user)
+    db.session.expire_all()
+    assert db.session.get(Blobs, content_hash) is None
+
+
+def test_delete_user_chunked_purge(test_client, user_with_photos):
+    """Тестирование удаления фотографий пользователя порциями."""
+    user = user_with_photos("chunked_user", 5)
+    assert count_photos(user.id) == 5
+
+    assert auth_Blueprint.users.delete_user(user, chunk_size=2)
+    assert count_photos(user.id) == 0
+    assert auth_Blueprint.users.find_user_by_username("chunked_user") is None
+
+
 def test_delete_none_token(test_client):
     """Тестирование удаления без токена."""
     response = test_client.delete("/api/user/delete")
     assert response.status_code == 401
     assert "Missing Authorization Header" in response.json["msg"]
+
+
+"""Тестирование пула хеширования паролей."""
+
+
+def test_hashing_pool_rejects_when_full():
+    """Тестирование отказа пула хеширования при переполнении очереди."""
+    release = threading.Event()
+
+    class SlowHasher:
+        def hash(self, password):
+            release.wait()
+            return password
+
+    pool = HashingPool(SlowHasher(), workers=1, queue_size=0, timeout=5)
+    worker = threading.Thread(target=pool.hash, args=("first",))
+    worker.start()
+    while pool.stats()["in_flight"] == 0:
+        pass
+
+    with pytest.raises(HashingUnavailable):
+        pool.hash("second")
+    release.set()
+    worker.join()
+
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_default_hashing_pool_workers():
+    """Тестирование размера пула хеширования по ядрам, процессам и потокам argon2."""
+    assert default_pool_workers(parallelism=4, processes=1, cores=16) == 4
+    assert default_pool_workers(parallelism=4, processes=2, cores=16) == 2
+    # gunicorn по умолчанию: 2 * 8 + 1 процессов на 8 ядрах
+    assert default_pool_workers(parallelism=4, processes=17, cores=8) == 1
+    assert default_pool_workers(parallelism=1, processes=1, cores=8) == 8
+
+
+def test_calibrate_hashing_parameters():
+    """Тестирование подбора параметров argon2 под целевое время."""
+    params = calibrate(1000, max_memory_cost=8 * 1024, parallelism=1, samples=1)
+    assert params["memory_cost"] == 8 * 1024
+    assert params["parallelism"] == 1
+    assert params["time_cost"] >= 1
+
+
+def test_hasher_profile_and_overrides():
+    """Тестирование выбора профиля хеширования и переопределения параметров."""
+    hasher = make_hasher({"PASSWORD_HASHER_PROFILE": "fast"})
+    assert (hasher.time_cost, hasher.memory_cost, hasher.parallelism) == (1, 8, 1)
+
+    hasher = make_hasher({"PASSWORD_HASHER_PROFILE": "fast", "ARGON2_TIME_COST": 2})
+    assert hasher.time_cost == 2
+    assert hasher.memory_cost == 8
+
+    with pytest.raises(ValueError):
+        make_hasher({"PASSWORD_HASHER_PROFILE": "unknown"})
+
+
+def test_tests_are_isolated(test_client, registered_user):
+    """Тестирование отката данных каждого теста: пользователь ровно один."""
+    assert db.session.query(Users).count() == 1
+
+
+"""Тестирование выхода и отзыва токенов."""
+
+
+def test_logout_revokes_only_current_token(test_client, registered_user, login):
+    """Тестирование выхода: отзывается только текущий токен."""
+    first = login(registered_user)["headers"]
+    second = login(registered_user)["headers"]
+
+    response = test_client.post("/api/user/logout", headers=first)
+    assert response.status_code == 200
+    assert response.json["msg"] == "Logout successful"
+
+    response = test_client.put("/api/user/edit", json={"email": 1}, headers=first)
+    assert response.status_code == 401
+    assert response.json["msg"] == "Token has been revoked"
+    response = test_client.put("/api/user/edit", json={"email": 1}, headers=second)
+    assert response.status_code == 400
+
+
+def test_logout_all_revokes_every_session(test_client, registered_user, login):
+    """Тестирование отзыва всех сессий пользователя."""
+    first = login(registered_user)["headers"]
+    second = login(registered_user)["headers"]
+
+    response = test_client.post("/api/user/logout/all", headers=first)
+    assert response.status_code == 200
+    for headers in (first, second):
+        response = test_client.get("/api/photos/", headers=headers)
+        assert response.status_code == 401
+
+    fresh = login(registered_user)["headers"]
+    assert test_client.get("/api/photos/", headers=fresh).status_code == 200
+
+
+def test_revocations_refresh_from_database(test_client, registered_user, login):
+    """Тестирование подхвата отзывов, сделанных другим процессом."""
+    headers = login(registered_user)["headers"]
+    user = auth_Blueprint.users.find_user_by_username(registered_user["username"])
+    other_process = RevocationService()
+    assert other_process.revoke_all(user.id, lifetime_seconds=3600)
+
+    revocations = auth_Blueprint.revocations
+    assert test_client.get("/api/photos/", headers=headers).status_code == 200
+    assert revocations.refresh()
+    assert test_client.get("/api/photos/", headers=headers).status_code == 401
+
+
+def test_revocations_poll_in_background(test_client, monkeypatch):
+    """Тестирование: отзывы подгружаются фоновым потоком, а не в запросе."""
+    revocations = RevocationService({"REVOCATION_REFRESH_SECONDS": 0.01})
+    polled = threading.Event()
+    poll_threads = set()
+
+    def refresh_on_own_connection():
+        poll_threads.add(threading.current_thread().name)
+        polled.set()
+        return True
+
+    monkeypatch.setattr(
+        revocations, "_refresh_on_own_connection", refresh_on_own_connection
+    )
+    try:
+        assert revocations.is_revoked({"jti": "unknown", "sub": "someone"}) is False
+        assert revocations.is_revoked({"jti": "unknown", "sub": "someone"}) is False
+        assert polled.wait(5)
+        assert [t.name for t in threading.enumerate()].count("revocations") == 1
+    finally:
+        revocations.stop()
+    assert poll_threads == {"revocations"}
+
+
+"""Тестирование обновления токенов."""
+
+
+def test_refresh_rotates_tokens(test_client, registered_user, login, bearer):
+    """Тестирование выдачи новой пары токенов по refresh-токену."""
+    tokens = login(registered_user)
+
+    response = test_client.post(
+        "/api/user/refresh", headers=bearer(tokens["refresh_token"])
+    )
+    assert response.status_code == 200
+    assert response.json["msg"] == "Refresh success"
+    assert response.json["refresh_token"] != tokens["refresh_token"]
+    response = test_client.get(
+        "/api/photos/", headers=bearer(response.json["access_token"])
+    )
+    assert response.status_code == 200
+
+    response = test_client.post(
+        "/api/user/refresh", headers=bearer(tokens["access_token"])
+    )
+    assert response.status_code == 422
+
+
+def test_refresh_does_not_hash(test_client, registered_user, login, bearer):
+    """Тестирование отсутствия вызовов argon2 при обновлении токенов."""
+    tokens = login(registered_user)
+    completed = auth_Blueprint.users.hashing.stats()["completed"]
+
+    response = test_client.post(
+        "/api/user/refresh", headers=bearer(tokens["refresh_token"])
+    )
+    assert response.status_code == 200
+    assert "argon2" not in response.headers["Server-Timing"]
+    assert auth_Blueprint.users.hashing.stats()["completed"] == completed
+
+
+def test_refresh_token_reuse_revokes_sessions(
+    test_client, registered_user, login, bearer
+):
+    """Тестирование отзыва всех сессий при повторном использовании refresh-токена."""
+    stolen = login(registered_user)
+    other = login(registered_user)
+    rotated = test_client.post(
+        "/api/user/refresh", headers=bearer(stolen["refresh_token"])
+    ).json
+
+    response = test_client.post(
+        "/api/user/refresh", headers=bearer(stolen["refresh_token"])
+    )
+    assert response.status_code == 401
+    assert response.json["msg"] == "Refresh token reuse detected"
+
+    for tokens in (rotated, other):
+        response = test_client.post(
+            "/api/user/refresh", headers=bearer(tokens["refresh_token"])
+        )
+        assert response.status_code == 401
+        response = test_client.get(
+            "/api/photos/", headers=bearer(tokens["access_token"])
+        )
+        assert response.status_code == 401
+
+
+def test_logout_ends_refresh_session(test_client, registered_user, login, bearer):
+    """Тестирование недействительности refresh-токена после выхода."""
+    tokens = login(registered_user)
+    test_client.post("/api/user/logout", headers=bearer(tokens["access_token"]))
+
+    response = test_client.post(
+        "/api/user/refresh", headers=bearer(tokens["refresh_token"])
+    )
+    assert response.status_code == 401
+    assert response.json["msg"] == "Invalid refresh token"
+
+
+"""Тестирование чтения с реплики."""
+
+
+@pytest.fixture
+def replica(test_client, tmp_path, monkeypatch):
+    """Реплика в отдельном файле SQLite рядом с основной базой тестов."""
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(engine, tables=[Users.__table__])
+    router = ReplicaRouter(
+        {"SQLALCHEMY_BINDS": {"replica_0": {}}, "REPLICA_STICKY_SECONDS": 60}
+    )
+    monkeypatch.setitem(db.engines, "replica_0", engine)
+    monkeypatch.setitem(test_client.application.extensions, "replicas", router)
+    yield engine
+    g.pop("replica_pinned", None)
+    engine.dispose()
+
+
+def test_find_user_reads_from_replica(test_client, replica, new_user):
+    """Тестирование чтения с реплики и чтения своих записей с основной базы."""
+    with replica.begin() as connection:
+        connection.execute(
+            sa.insert(Users).values(
+                id="replica-only",
+                username="replica_user",
+                email="replica_user@example.com",
+                password_hash="x",
+            )
+        )
+    test_client.post("/api/user/register", json=new_user)
+    g.pop("replica_pinned", None)
+
+    users = auth_Blueprint.users
+    assert users.find_user_by_username("replica_user").id == "replica-only"
+    assert users.find_user_by_username("replica_user", primary=True) is None
+    # Just registered in this process: read from the primary, not the
+    # replica that has not caught up.
+    assert users.find_user_by_username(new_user["username"]) is not None
+    # Another worker knows nothing of the write: the replica misses and the
+    # lookup is retried on the primary.
+    test_client.application.extensions["replicas"].sticky.clear()
+    assert users.find_user_by_username(new_user["username"]) is not None
+
+
+def test_write_pins_client_to_primary(test_client, replica):
+    """Тестирование cookie, направляющей запросы клиента на основную базу."""
+    app = test_client.application
+    router = app.extensions["replicas"]
+    with app.test_request_context():
+        router.mark_write(())
+        response = router.pin_client(app.response_class())
+    cookie = response.headers["Set-Cookie"].split(";")[0]
+    assert cookie.startswith("primary_until=")
+
+    with app.test_request_context(headers={"Cookie": cookie}):
+        router.pin_request()
+        assert router.choose(()) is None
+    with app.test_request_context():
+        router.pin_request()
+        assert router.choose(()) == "replica_0"
+
+
+def test_unhealthy_replica_falls_back_to_primary(test_client, replica):
+    """Тестирование перехода на основную базу при отказе реплики."""
+    db.session.execute(
+        sa.insert(Users).values(
+            id="primary-only",
+            username="primary_user",
+            email="primary_user@example.com",
+            password_hash="x",
+        )
+    )
+    with replica.begin() as connection:
+        connection.execute(sa.text("DROP TABLE users"))
+
+    router = test_client.application.extensions["replicas"]
+    assert router.status() == {"replica_0": {"healthy": True}}
+    user = auth_Blueprint.users.find_user_by_email("primary_user@example.com")
+    assert user.id == "primary-only"
+    assert router.status() == {"replica_0": {"healthy": False}}
+
+
+def test_production_requires_secret_keys(monkeypatch):
+    """Тестирование отказа запуска в production без ключей подписи."""
+    monkeypatch.setattr(ProductionConfig, "SECRET_KEY", "secret")
+    monkeypatch.setattr(ProductionConfig, "JWT_SECRET_KEY", None)
+    with pytest.raises(RuntimeError, match="JWT_SECRET_KEY"):
+        create_app("production")
@@ -0,0 +1,80 @@
+-- Brings a database created from an older init.sql up to the current schema.
+-- init.sql only runs on a fresh volume, so existing installs apply this once:
+--
+--   docker compose exec -T postgres psql -U "$POSTGRES_USER" -d "$POSTGRES_DB" < upgrade.sql
+--
+-- Every statement is idempotent; re-running it on an up-to-date database is a
+-- no-op. Requires PostgreSQL 12+ (generated columns).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS blobs
+(
+    sha256 varchar(64) PRIMARY KEY,
+    size bigint NOT NULL,
+    content_type varchar(127) NOT NULL,
+    refcount integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS revoked_tokens
+(
+    id serial PRIMARY KEY,
+    user_id varchar(64) NOT NULL,
+    jti varchar(64),
+    issued_before bigint,
+    expires_at bigint NOT NULL,
+    revoked_at bigint NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_expires_at ON revoked_tokens (expires_at);
+CREATE INDEX IF NOT EXISTS ix_revoked_tokens_revoked_at ON revoked_tokens (revoked_at);
+
+CREATE TABLE IF NOT EXISTS refresh_tokens
+(
+    jti varchar(64) PRIMARY KEY,
+    user_id varchar(64) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    family varchar(64) NOT NULL,
+    expires_at bigint NOT NULL,
+    used_at bigint
+);
+
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens (user_id);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family ON refresh_tokens (family);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_expires_at ON refresh_tokens (expires_at);
+
+-- Widening a varchar is a catalog-only change, no table rewrite.
+ALTER TABLE photos ALTER COLUMN photo_url TYPE varchar(255);
+
+-- Rows that predate the column all get the upgrade time; the id tiebreak in
+-- the keyset order keeps their pagination stable.
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS created_at timestamp NOT NULL DEFAULT now();
+
+-- Photos added by URL have no blob, so existing rows stay NULL.
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS content_hash varchar(64) REFERENCES blobs(sha256);
+
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS
+    (to_tsvector('simple', coalesce(description, ''))) STORED;
+
+-- The old idx_user_id covered (user_id) only; CREATE INDEX IF NOT EXISTS would
+-- keep it under the same name, so drop it unless it is already the keyset one.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE tablename = 'photos'
+            AND indexname = 'idx_user_id'
+            AND indexdef NOT LIKE '%(user_id, created_at, id)%'
+    ) THEN
+        DROP INDEX idx_user_id;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_user_id ON photos (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_photos_content_hash ON photos (content_hash);
+CREATE INDEX IF NOT EXISTS ix_photos_search_vector ON photos USING GIN (search_vector);
+
+-- Left behind by a build that versioned photo lists per user; list ETags are
+-- now derived from the page itself.
+ALTER TABLE users DROP COLUMN IF EXISTS photos_version;
+
+COMMIT;